@@ -0,0 +1,84 @@
+WAIT = 0
+SAIL = 1
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+COLLECT = SAIL + len(DIRECTIONS)
+
+
+class ActionCodec:
+    """
+    Encodes actions as integers.
+    An atomic action is a code in range(num_actions): WAIT, SAIL + direction (in the order of DIRECTIONS),
+    COLLECT + treasure slot, deposit_base + treasure slot, plunder_base + ship index.
+    A joint action packs the codes of the player's ships (in player_ships order) in base num_actions.
+    Sail codes are relative to the ship's location, so decoding needs the state the action is played from.
+    """
+    def __init__(self, state, treasure_names):
+        self.ship_names = tuple(state['pirate_ships'].keys())
+        self.ship_index = {name: i for i, name in enumerate(self.ship_names)}
+        self.treasure_names = tuple(treasure_names) + tuple(
+            name for name in state['treasures'] if name not in treasure_names)
+        self.treasure_index = {name: i for i, name in enumerate(self.treasure_names)}
+        self.player_ships = {}
+        for name, ship in state['pirate_ships'].items():
+            self.player_ships.setdefault(ship['player'], []).append(name)
+        self.deposit_base = COLLECT + len(self.treasure_names)
+        self.plunder_base = self.deposit_base + len(self.treasure_names)
+        self.num_actions = self.plunder_base + len(self.ship_names)
+
+    def encode_atomic(self, atomic_action, location):
+        """
+        location is the current location of the acting ship
+        """
+        kind = atomic_action[0]
+        if kind == 'wait':
+            return WAIT
+        if kind == 'sail':
+            return SAIL + DIRECTIONS.index((atomic_action[2][0] - location[0], atomic_action[2][1] - location[1]))
+        if kind == 'collect':
+            return COLLECT + self.treasure_index[atomic_action[2]]
+        if kind == 'deposit':
+            return self.deposit_base + self.treasure_index[atomic_action[2]]
+        if kind == 'plunder':
+            return self.plunder_base + self.ship_index[atomic_action[2]]
+        raise ValueError(f"Unknown action {atomic_action}")
+
+    def decode_atomic(self, ship_name, code, location):
+        if code == WAIT:
+            return 'wait', ship_name
+        if code < COLLECT:
+            dx, dy = DIRECTIONS[code - SAIL]
+            return 'sail', ship_name, (location[0] + dx, location[1] + dy)
+        if code < self.deposit_base:
+            return 'collect', ship_name, self.treasure_names[code - COLLECT]
+        if code < self.plunder_base:
+            return 'deposit', ship_name, self.treasure_names[code - self.deposit_base]
+        if code < self.num_actions:
+            return 'plunder', ship_name, self.ship_names[code - self.plunder_base]
+        raise ValueError(f"Unknown action code {code}")
+
+    def encode(self, action, state):
+        """
+        packs a joint action of one player, played from state
+        """
+        codes = {atomic_action[1]: self.encode_atomic(atomic_action, state['pirate_ships'][atomic_action[1]]['location'])
+                 for atomic_action in action}
+        return self.pack(codes, state['pirate_ships'][action[0][1]]['player'])
+
+    def pack(self, codes, player):
+        """
+        packs the atomic action codes of a player's ships, given as ship name -> code
+        """
+        code = 0
+        for ship_name in reversed(self.player_ships[player]):
+            code = code * self.num_actions + codes[ship_name]
+        return code
+
+    def decode(self, code, player, state):
+        """
+        unpacks a joint action of player, played from state
+        """
+        action = []
+        for ship_name in self.player_ships[player]:
+            code, atomic_code = divmod(code, self.num_actions)
+            action.append(self.decode_atomic(ship_name, atomic_code, state['pirate_ships'][ship_name]['location']))
+        return tuple(action)
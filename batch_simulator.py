@@ -0,0 +1,305 @@
+from collections import deque
+
+import numpy as np
+
+from action_codec import WAIT, SAIL, DIRECTIONS, COLLECT
+from compact_state import CompactState, ABSENT
+from simulator import TREASURE_ARRIVAL_PROBABILITY, TREASURE_NAMES
+
+MAX_TREASURES = 10
+MARINE_COLLISION_PENALTY = 1
+FULL_CAPACITY = 2
+
+
+class BatchSimulator:
+    """
+    Holds N independent games on the same map in NumPy arrays and advances all of them together.
+    Atomic actions are integer codes per ship: WAIT, SAIL + direction (in the order of DIRECTIONS),
+    collect_code(t), deposit_code(t) and plunder_code(s), where t is a treasure slot and s a ship index,
+    the same codes as ActionCodec.
+    Actions are trusted, use random_actions() to draw legal ones.
+    """
+    def __init__(self, states, seed=None):
+        first = CompactState.from_dict(states[0])
+        self.rows, self.cols = first.rows, first.cols
+        self.base = first.base
+        self.ship_names = first.ship_names
+        self.treasure_names = first.treasure_names
+        self.marine_names = first.marine_names
+        self.ship_player = np.array(first.ship_player, dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+
+        longest = max([len(path) for path in first.marine_paths], default=1)
+        self.marine_paths = np.zeros((len(first.marine_names), longest), dtype=np.int64)
+        self.marine_path_length = np.array([len(path) for path in first.marine_paths], dtype=np.int64)
+        for m, path in enumerate(first.marine_paths):
+            self.marine_paths[m, :len(path)] = path
+
+        grid = np.frombuffer(bytes(first.grid), dtype=np.uint8)
+        self.island = grid == ord('I')
+        self.island_cells = np.flatnonzero(self.island)
+        self.sail_target = np.full((grid.size, len(DIRECTIONS)), -1, dtype=np.int64)
+        for cell in range(grid.size):
+            x, y = divmod(cell, self.cols)
+            for d, (dx, dy) in enumerate(DIRECTIONS):
+                if 0 <= x + dx < self.rows and 0 <= y + dy < self.cols and not self.island[cell + dx * self.cols + dy]:
+                    self.sail_target[cell, d] = cell + dx * self.cols + dy
+        # only the standard names are drawn when spawning, like Simulator.add_treasure
+        self.spawnable = np.array([name in TREASURE_NAMES for name in self.treasure_names])
+        self.base_distance = self._distances_to_base()
+        self.player_ships = {player: np.flatnonzero(self.ship_player == player) for player in (1, 2)}
+        self.num_actions = self.plunder_code(len(self.ship_names))
+        self._template = first
+        self.load(states)
+
+    def load(self, states):
+        """
+        Replaces the games by states of the same map, with zero scores.
+        Reusing a simulator this way skips rebuilding the map tables.
+        """
+        compact = [CompactState.from_dict(state, self.treasure_names) for state in states]
+        self.n = len(compact)
+        self.ship_location = np.array([c.ship_location for c in compact], dtype=np.int64)
+        self.ship_capacity = np.array([c.ship_capacity for c in compact], dtype=np.int64)
+        self.treasure_location = np.array([c.treasure_location for c in compact], dtype=np.int64)
+        self.treasure_reward = np.array([c.treasure_reward for c in compact], dtype=np.int64)
+        self.marine_index = np.array([c.marine_index for c in compact], dtype=np.int64).reshape(self.n, -1)
+        self.score = np.zeros((self.n, 2), dtype=np.int64)
+        self.turns_to_go = np.array([c.turns_to_go for c in compact], dtype=np.int64)
+
+    def _distances_to_base(self):
+        """
+        Sailing distance of every cell to the base, the number of cells for cells the base cannot be reached from
+        """
+        distance = np.full(self.sail_target.shape[0], self.sail_target.shape[0], dtype=np.int64)
+        distance[self.base] = 0
+        queue = deque([self.base])
+        while queue:
+            cell = queue.popleft()
+            for target in self.sail_target[cell]:
+                if target >= 0 and distance[target] > distance[cell] + 1:
+                    distance[target] = distance[cell] + 1
+                    queue.append(target)
+        return distance
+
+    @classmethod
+    def from_state(cls, state, n, seed=None):
+        """
+        N copies of the same game
+        """
+        return cls([state] * n, seed)
+
+    def collect_code(self, treasure):
+        return COLLECT + treasure
+
+    def deposit_code(self, treasure):
+        return COLLECT + len(self.treasure_names) + treasure
+
+    def plunder_code(self, ship):
+        return COLLECT + 2 * len(self.treasure_names) + ship
+
+    def _adjacent(self, cells_a, cells_b):
+        ax, ay = np.divmod(cells_a, self.cols)
+        bx, by = np.divmod(cells_b, self.cols)
+        return np.abs(ax - bx) + np.abs(ay - by) == 1
+
+    def legal_mask(self, ship, taken=None):
+        """
+        (N, num_actions) mask of the legal atomic actions of a ship in every game.
+        taken masks treasures already collected by another ship in the same joint action.
+        """
+        n_treasures = len(self.treasure_names)
+        mask = np.zeros((self.n, self.num_actions), dtype=bool)
+        location = self.ship_location[:, ship]
+        mask[:, WAIT] = True
+        mask[:, SAIL:COLLECT] = self.sail_target[location] >= 0
+        on_island = self.treasure_location >= 0
+        can_collect = on_island & self._adjacent(location[:, None], np.where(on_island, self.treasure_location, 0))
+        can_collect &= (self.ship_capacity[:, ship] > 0)[:, None]
+        if taken is not None:
+            can_collect &= ~taken
+        mask[:, COLLECT:COLLECT + n_treasures] = can_collect
+        at_base = (location == self.base)[:, None]
+        mask[:, self.deposit_code(0):self.deposit_code(n_treasures)] = \
+            at_base & (self.treasure_location == -2 - ship)
+        enemies = self.ship_player != self.ship_player[ship]
+        mask[:, self.plunder_code(0):] = (self.ship_location == location[:, None]) & enemies[None, :]
+        return mask
+
+    def _preference(self, ship):
+        """
+        (N, num_actions) ranks of the greedy policy: deposit, then collect, then sail towards the base when holding
+        a treasure, then anything else
+        """
+        preference = np.zeros((self.n, self.num_actions))
+        n_treasures = len(self.treasure_names)
+        preference[:, self.deposit_code(0):self.deposit_code(n_treasures)] = 3
+        preference[:, COLLECT:self.deposit_code(0)] = 2
+        location = self.ship_location[:, ship]
+        target = self.sail_target[location]
+        closer = (target >= 0) & (self.base_distance[target] < self.base_distance[location][:, None])
+        preference[:, SAIL:COLLECT] = closer & (self.ship_capacity[:, ship] < FULL_CAPACITY)[:, None]
+        return preference
+
+    def random_actions(self, player, greedy=False):
+        """
+        Draws a uniformly random legal atomic action for every ship of the player in every game.
+        With greedy, the action is drawn among the best ranked by _preference() instead.
+        Returns an (N, ships of player) array of codes.
+        """
+        ships = self.player_ships[player]
+        codes = np.zeros((self.n, len(ships)), dtype=np.int64)
+        taken = np.zeros(self.treasure_location.shape, dtype=bool)
+        rows = np.arange(self.n)
+        for i, ship in enumerate(ships):
+            mask = self.legal_mask(ship, taken)
+            keys = self.rng.random(mask.shape)
+            if greedy:
+                keys += self._preference(ship)
+            keys = np.where(mask, keys, -1.0)
+            codes[:, i] = np.argmax(keys, axis=1)
+            collected = (codes[:, i] >= COLLECT) & (codes[:, i] < self.deposit_code(0))
+            taken[rows[collected], codes[collected, i] - COLLECT] = True
+        return codes
+
+    def apply_actions(self, player, codes):
+        """
+        Applies the (N, ships of player) atomic action codes, ship by ship, in all games at once
+        """
+        rows = np.arange(self.n)
+        n_treasures = len(self.treasure_names)
+        for i, ship in enumerate(self.player_ships[player]):
+            code = codes[:, i]
+            sail = (code >= SAIL) & (code < COLLECT)
+            if sail.any():
+                self.ship_location[sail, ship] = self.sail_target[self.ship_location[sail, ship], code[sail] - SAIL]
+            collect = (code >= COLLECT) & (code < self.deposit_code(0))
+            if collect.any():
+                self.ship_capacity[collect, ship] -= 1
+                self.treasure_location[rows[collect], code[collect] - COLLECT] = -2 - ship
+            deposit = (code >= self.deposit_code(0)) & (code < self.deposit_code(n_treasures))
+            if deposit.any():
+                treasure = code[deposit] - self.deposit_code(0)
+                self.ship_capacity[deposit, ship] += 1
+                self.score[deposit, player - 1] += self.treasure_reward[rows[deposit], treasure]
+                self.treasure_location[rows[deposit], treasure] = ABSENT
+            plunder = code >= self.plunder_code(0)
+            if plunder.any():
+                target = code - self.plunder_code(0)
+                self.ship_capacity[rows[plunder], target[plunder]] = FULL_CAPACITY
+                plundered = plunder[:, None] & (self.treasure_location == (-2 - target)[:, None])
+                self.treasure_location[plundered] = ABSENT
+        self.turns_to_go -= 1
+
+    def add_treasure(self):
+        """
+        Spawns a treasure with a free name on a random island in every game with less than 10 treasures,
+        with probability TREASURE_ARRIVAL_PROBABILITY
+        """
+        if self.island_cells.size == 0:
+            return
+        present = self.treasure_location != ABSENT
+        spawn = (present.sum(axis=1) < MAX_TREASURES) & (self.rng.random(self.n) < TREASURE_ARRIVAL_PROBABILITY)
+        if not spawn.any():
+            return
+        free = ~present[spawn] & self.spawnable[None, :]
+        slot = np.argmax(np.where(free, self.rng.random(free.shape), -1.0), axis=1)
+        rows = np.flatnonzero(spawn)
+        self.treasure_location[rows, slot] = self.island_cells[self.rng.integers(0, self.island_cells.size, rows.size)]
+        self.treasure_reward[rows, slot] = self.rng.integers(1, 10, rows.size)
+
+    def marine_locations(self):
+        """
+        (N, marines) cells of the marines
+        """
+        return self.marine_paths[np.arange(self.marine_paths.shape[0])[None, :], self.marine_index]
+
+    def check_collision_with_marines(self):
+        """
+        Checks collisions with marines in every game, applies penalties. Does not move them
+        """
+        if self.marine_paths.shape[0] == 0:
+            return
+        collided = (self.ship_location[:, :, None] == self.marine_locations()[:, None, :]).any(axis=2)
+        if not collided.any():
+            return
+        self.ship_capacity[collided] = FULL_CAPACITY
+        for player in (1, 2):
+            self.score[:, player - 1] -= MARINE_COLLISION_PENALTY * collided[:, self.player_ships[player]].sum(axis=1)
+        held = self.treasure_location < ABSENT
+        holder = np.where(held, -2 - self.treasure_location, 0)
+        lost = held & np.take_along_axis(collided, holder, axis=1)
+        self.treasure_location[lost] = ABSENT
+
+    def move_marines(self):
+        """
+        Moves marines uniformly along their path in every game
+        """
+        if self.marine_paths.shape[0] == 0:
+            return
+        index = self.marine_index
+        last = self.marine_path_length[None, :] - 1
+        at_start = index == 0
+        at_end = index == last
+        options = np.where(at_start | at_end, 2, 3)
+        draw = (self.rng.random(index.shape) * options).astype(np.int64)
+        moved = np.where(at_start, index + draw, np.where(at_end, index - draw, index - 1 + draw))
+        self.marine_index = np.where(last == 0, index, moved)
+
+    def step(self, codes_p1, codes_p2):
+        """
+        A full round in every game: both players act, each followed by a treasure spawn, then collisions
+        and marine moves.
+        """
+        self.apply_actions(1, codes_p1)
+        self.add_treasure()
+        self.apply_actions(2, codes_p2)
+        self.add_treasure()
+        self.end_round()
+
+    def end_round(self):
+        """
+        Collisions and marine moves, after both players acted
+        """
+        self.check_collision_with_marines()
+        self.move_marines()
+
+    def rollout(self, rounds, greedy=False):
+        """
+        Plays rounds rounds of random_actions() for both players, returns the (N, 2) scores.
+        rounds may also be an (N,) array of rounds per game, the scores of a game are taken after its last round.
+        """
+        rounds = np.broadcast_to(rounds, (self.n,))
+        scores = self.score.copy()
+        for played in range(1, int(rounds.max(initial=0)) + 1):
+            self.step(self.random_actions(1, greedy), self.random_actions(2, greedy))
+            finished = rounds >= played
+            scores[finished] = self.score[finished]
+        return scores
+
+    def atomic_action(self, game, ship, code):
+        """
+        The simulator tuple of the code of ship in game
+        """
+        name = self.ship_names[ship]
+        n_treasures = len(self.treasure_names)
+        if code == WAIT:
+            return 'wait', name
+        if code < COLLECT:
+            return 'sail', name, divmod(int(self.sail_target[self.ship_location[game, ship], code - SAIL]), self.cols)
+        if code < self.deposit_code(0):
+            return 'collect', name, self.treasure_names[code - COLLECT]
+        if code < self.deposit_code(n_treasures):
+            return 'deposit', name, self.treasure_names[code - self.deposit_code(0)]
+        return 'plunder', name, self.ship_names[code - self.plunder_code(0)]
+
+    def get_state(self, game):
+        """
+        The dict state of one of the games
+        """
+        template = self._template
+        return CompactState(self.rows, self.cols, template.grid, self.base, self.ship_names, template.ship_player,
+                            self.ship_location[game].tolist(), self.ship_capacity[game].tolist(),
+                            self.treasure_names, self.treasure_location[game].tolist(),
+                            self.treasure_reward[game].tolist(), self.marine_names, template.marine_paths,
+                            self.marine_index[game].tolist(), int(self.turns_to_go[game])).to_dict()
@@ -0,0 +1,141 @@
+from statistics import quantiles
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import timeit
+
+from main import Game
+from scenarios import generate
+from simulator import Simulator
+from tournament import load_agent
+import sample_agent
+
+
+def random_action(simulator, player):
+    collected = []
+    action = []
+    for ship_name, ship in simulator.state['pirate_ships'].items():
+        if ship['player'] != player:
+            continue
+        atomic_action = random.choice([atomic_action for atomic_action in simulator.legal_atomic_actions(ship_name)
+                                       if atomic_action[0] != 'collect' or atomic_action[2] not in collected])
+        if atomic_action[0] == 'collect':
+            collected.append(atomic_action[2])
+        action.append(atomic_action)
+    return tuple(action)
+
+
+def rounds_per_second(an_input, seconds):
+    """
+    Full simulator rounds with uniformly random legal actions
+    """
+    simulator = Simulator(an_input)
+    start = simulator.snapshot()
+    rounds = 0
+    deadline = time.perf_counter() + seconds
+    begin = time.perf_counter()
+    while time.perf_counter() < deadline:
+        simulator.restore(start)
+        for _ in range(an_input['turns to go']):
+            simulator.act_unchecked(random_action(simulator, 1), 1)
+            simulator.act_unchecked(random_action(simulator, 2), 2)
+            simulator.check_collision_with_marines()
+            simulator.move_marines()
+        rounds += an_input['turns to go']
+    return rounds / (time.perf_counter() - begin)
+
+
+def microbenchmarks(an_input, number):
+    """
+    Seconds per call of the simulator hot paths
+    """
+    simulator = Simulator(an_input)
+    location = next(iter(simulator.state['pirate_ships'].values()))['location']
+    action = random_action(simulator, 1)
+    return {
+        'neighbors': timeit.timeit(lambda: simulator.neighbors(location), number=number) / number,
+        'check_if_action_legal': timeit.timeit(lambda: simulator.check_if_action_legal(action, 1),
+                                               number=number) / number,
+        'move_marines': timeit.timeit(simulator.move_marines, number=number) / number,
+    }
+
+
+def episodes_per_second(an_input, seconds):
+    """
+    Quiet Game episodes of sample_agent against itself
+    """
+    episodes = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        game = Game(an_input, quiet=True)
+        game.agents = [game.initiate_agent(sample_agent, 1), game.initiate_agent(sample_agent, 2)]
+        game.ids = ['sample_agent', 'sample_agent']
+        game.play_episode()
+        episodes += 1
+    return episodes / (time.perf_counter() - begin)
+
+
+def move_latency(an_input, agent_spec, rounds):
+    """
+    Percentiles in milliseconds of the time agent_spec takes per act, playing as player 1 against sample_agent
+    """
+    module, uct_flag = load_agent(agent_spec)
+    game = Game(an_input, quiet=True)
+    agents = [game.initiate_agent(module, 1, uct_flag), game.initiate_agent(sample_agent, 2)]
+    latencies = []
+    for _ in range(min(rounds, an_input['turns to go'])):
+        start = time.perf_counter_ns()
+        action = agents[0].act(game.simulator.get_state())
+        latencies.append((time.perf_counter_ns() - start) / 1e6)
+        game.simulator.act(action, 1)
+        game.simulator.act(agents[1].act(game.simulator.get_state()), 2)
+        game.simulator.check_collision_with_marines()
+        game.simulator.move_marines()
+    cuts = quantiles(latencies, n=100, method='inclusive')
+    return {'moves': len(latencies), 'p50': cuts[49], 'p95': cuts[94], 'p99': cuts[98], 'max': max(latencies)}
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        return commit or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the simulator and agents, writes the results as json.')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--agents', nargs='*', default=['sample_agent'],
+                        help="agent modules for the latency measurement, add ':UCTAgent' for the UCT agent")
+    parser.add_argument('--sizes', nargs='*', type=int, default=[7, 20, 50])
+    parser.add_argument('--ships', nargs='*', type=int, default=[2, 4])
+    parser.add_argument('--seconds', type=float, default=2.0, help='duration of each throughput measurement')
+    parser.add_argument('--number', type=int, default=10000, help='calls per microbenchmark')
+    parser.add_argument('--rounds', type=int, default=50, help='moves per latency measurement')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    results = {'commit': git_commit(), 'python': platform.python_version(), 'time': time.time(), 'runs': []}
+    for size in args.sizes:
+        for ships in args.ships:
+            random.seed(args.seed)
+            an_input = generate(size, ships_per_player=ships, treasures=2, seed=args.seed)
+            run = {'size': size, 'ships_per_player': ships,
+                   'rounds_per_second': rounds_per_second(an_input, args.seconds),
+                   'seconds_per_call': microbenchmarks(an_input, args.number),
+                   'episodes_per_second': episodes_per_second(an_input, args.seconds),
+                   'move_latency_ms': {agent: move_latency(an_input, agent, args.rounds) for agent in args.agents}}
+            results['runs'].append(run)
+            print(f"{size}x{size}, {ships} ships per player: {run['rounds_per_second']:.0f} rounds/s, "
+                  f"{run['episodes_per_second']:.2f} episodes/s")
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
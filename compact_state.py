@@ -0,0 +1,168 @@
+from array import array
+
+from simulator import TREASURE_NAMES
+
+ABSENT = -1
+
+
+class CompactState:
+    """
+    An array backed version of the simulator state.
+    Cells are stored as a single index (row * cols + col), ships, treasures and marines are referred to by their
+    position in the name tuples, and the map is a bytearray of the map characters.
+    A treasure location is ABSENT when the treasure is not in the game, a cell index when it lies on an island,
+    and holder_code(ship_index) when a ship carries it.
+    """
+    __slots__ = ('rows', 'cols', 'grid', 'base', 'ship_names', 'ship_player', 'ship_location', 'ship_capacity',
+                 'treasure_names', 'treasure_location', 'treasure_reward', 'marine_names', 'marine_paths',
+                 'marine_index', 'turns_to_go')
+
+    def __init__(self, rows, cols, grid, base, ship_names, ship_player, ship_location, ship_capacity,
+                 treasure_names, treasure_location, treasure_reward, marine_names, marine_paths, marine_index,
+                 turns_to_go):
+        self.rows = rows
+        self.cols = cols
+        self.grid = grid
+        self.base = base
+        self.ship_names = ship_names
+        self.ship_player = ship_player
+        self.ship_location = ship_location
+        self.ship_capacity = ship_capacity
+        self.treasure_names = treasure_names
+        self.treasure_location = treasure_location
+        self.treasure_reward = treasure_reward
+        self.marine_names = marine_names
+        self.marine_paths = marine_paths
+        self.marine_index = marine_index
+        self.turns_to_go = turns_to_go
+
+    @classmethod
+    def from_dict(cls, state, treasure_names=None):
+        """
+        Builds a compact state from the dict state used by the simulator.
+        treasure_names fixes the treasure slots, by default TREASURE_NAMES and any other name found in the state.
+        """
+        rows, cols = len(state['map']), len(state['map'][0])
+        if treasure_names is None:
+            treasure_names = tuple(TREASURE_NAMES) + tuple(
+                name for name in state['treasures'] if name not in TREASURE_NAMES)
+        compact = cls(
+            rows, cols, bytearray(ord(cell) for row in state['map'] for cell in row),
+            state['base'][0] * cols + state['base'][1],
+            tuple(state['pirate_ships'].keys()),
+            array('i', [ship['player'] for ship in state['pirate_ships'].values()]),
+            None, None, tuple(treasure_names), None, None,
+            tuple(state['marine_ships'].keys()),
+            tuple(tuple(r * cols + c for r, c in marine['path']) for marine in state['marine_ships'].values()),
+            None, None)
+        compact.update(state)
+        return compact
+
+    def update(self, state):
+        """
+        Refreshes the ships, treasures, marine indices and turns to go from a dict state of the same game
+        """
+        cols = self.cols
+        ship_slot = {name: i for i, name in enumerate(self.ship_names)}
+        self.ship_location = array('i', [ship['location'][0] * cols + ship['location'][1]
+                                         for ship in state['pirate_ships'].values()])
+        self.ship_capacity = array('i', [ship['capacity'] for ship in state['pirate_ships'].values()])
+        self.treasure_location = array('i', [ABSENT] * len(self.treasure_names))
+        self.treasure_reward = array('i', [0] * len(self.treasure_names))
+        for i, name in enumerate(self.treasure_names):
+            if name not in state['treasures']:
+                continue
+            location = state['treasures'][name]['location']
+            if type(location) == str:
+                self.treasure_location[i] = holder_code(ship_slot[location])
+            else:
+                self.treasure_location[i] = location[0] * cols + location[1]
+            self.treasure_reward[i] = state['treasures'][name]['reward']
+        self.marine_index = array('i', [marine['index'] for marine in state['marine_ships'].values()])
+        self.turns_to_go = state['turns to go']
+
+    def to_dict(self, game_map=None):
+        """
+        Rebuilds the dict state used by the simulator, Game and the agents.
+        A game_map given is used as the map instead of rebuilding it from the grid.
+        """
+        cols = self.cols
+        if game_map is None:
+            game_map = [[chr(self.grid[r * cols + c]) for c in range(cols)] for r in range(self.rows)]
+        state = {
+            'map': game_map,
+            'base': divmod(self.base, cols),
+            'pirate_ships': {},
+            'treasures': {},
+            'marine_ships': {},
+            'turns to go': self.turns_to_go
+        }
+        for i, name in enumerate(self.ship_names):
+            state['pirate_ships'][name] = {'location': divmod(self.ship_location[i], cols),
+                                           'capacity': self.ship_capacity[i],
+                                           'player': self.ship_player[i]}
+        for i, name in enumerate(self.treasure_names):
+            location = self.treasure_location[i]
+            if location == ABSENT:
+                continue
+            if location < ABSENT:
+                location = self.ship_names[holder_index(location)]
+            else:
+                location = divmod(location, cols)
+            state['treasures'][name] = {'location': location, 'reward': self.treasure_reward[i]}
+        for i, name in enumerate(self.marine_names):
+            state['marine_ships'][name] = {'index': self.marine_index[i],
+                                           'path': [divmod(cell, cols) for cell in self.marine_paths[i]]}
+        return state
+
+    def copy(self):
+        """
+        Copies the mutable arrays, the map, names and paths are shared.
+        """
+        return CompactState(self.rows, self.cols, self.grid, self.base, self.ship_names, self.ship_player,
+                            array('i', self.ship_location), array('i', self.ship_capacity), self.treasure_names,
+                            array('i', self.treasure_location), array('i', self.treasure_reward),
+                            self.marine_names, self.marine_paths, array('i', self.marine_index), self.turns_to_go)
+
+    def packed_size(self):
+        """
+        The size in bytes of pack_into(), the same for every state of a game
+        """
+        return 4 * (2 * len(self.ship_names) + 2 * len(self.treasure_names) + len(self.marine_names) + 1)
+
+    def pack_into(self, buffer):
+        """
+        Writes the ship, treasure and marine arrays and the turns to go into buffer, e.g. shared memory.
+        The map, names and paths are not written, unpack_from() takes them from the receiving state.
+        """
+        values = (self.ship_location + self.ship_capacity + self.treasure_location + self.treasure_reward +
+                  self.marine_index + array('i', [self.turns_to_go]))
+        buffer[:self.packed_size()] = values.tobytes()
+
+    def unpack_from(self, buffer):
+        values = array('i')
+        values.frombytes(bytes(buffer[:self.packed_size()]))
+        ships, treasures, marines = len(self.ship_names), len(self.treasure_names), len(self.marine_names)
+        self.ship_location, values = values[:ships], values[ships:]
+        self.ship_capacity, values = values[:ships], values[ships:]
+        self.treasure_location, values = values[:treasures], values[treasures:]
+        self.treasure_reward, values = values[:treasures], values[treasures:]
+        self.marine_index, values = values[:marines], values[marines:]
+        self.turns_to_go = values[0]
+
+    def cell(self, location):
+        return location[0] * self.cols + location[1]
+
+    def location(self, cell):
+        return divmod(cell, self.cols)
+
+
+def holder_code(ship_index):
+    """
+    The treasure location code of a treasure carried by the ship at ship_index
+    """
+    return -2 - ship_index
+
+
+def holder_index(code):
+    return -2 - code
@@ -0,0 +1,52 @@
+import inspect
+import time
+
+SAFETY_MARGIN = 0.2
+
+
+class Deadline:
+    """
+    The time budget of one act() call. Game passes one to agents whose act() takes a deadline argument.
+    """
+    def __init__(self, seconds, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.end = self.start + seconds
+
+    def remaining(self):
+        return self.end - time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def expired(self, margin=0.0):
+        return self.remaining() <= margin
+
+
+def anytime(iterate, best, deadline, margin=SAFETY_MARGIN, max_iterations=None):
+    """
+    Calls iterate() until margin seconds (plus the longest iteration so far) are left before the deadline,
+    or max_iterations were done, then returns best().
+    At least one iteration is always done. Without a deadline only max_iterations stops the loop.
+    """
+    iterations = 0
+    longest = 0.0
+    while True:
+        started = time.perf_counter()
+        iterate()
+        iterations += 1
+        longest = max(longest, time.perf_counter() - started)
+        if max_iterations is not None and iterations >= max_iterations:
+            break
+        if deadline is not None and deadline.remaining() <= margin + longest:
+            break
+    return best()
+
+
+_accepts_deadline = {}
+
+
+def accepts_deadline(agent):
+    agent_type = type(agent)
+    if agent_type not in _accepts_deadline:
+        _accepts_deadline[agent_type] = 'deadline' in inspect.signature(agent.act).parameters
+    return _accepts_deadline[agent_type]
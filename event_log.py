@@ -0,0 +1,56 @@
+import json
+
+from timing import format_summary
+
+
+class EventLog:
+    """
+    Collects game events (dicts) in memory and writes them to a JSONL file in bulk,
+    when buffer_size events are pending and on flush().
+    Without a path the events stay in self.events. Every event is also passed to the sinks, e.g. print_event.
+    """
+    def __init__(self, path=None, buffer_size=10000, sinks=()):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.sinks = list(sinks)
+        self.events = []
+        if path is not None:
+            open(path, 'w').close()
+
+    def emit(self, event):
+        self.events.append(event)
+        for sink in self.sinks:
+            sink(event)
+        if self.path is not None and len(self.events) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.path is None or not self.events:
+            return
+        with open(self.path, 'a') as f:
+            f.write('\n'.join(json.dumps(event) for event in self.events) + '\n')
+        self.events = []
+
+
+def print_event(event):
+    """
+    Prints an event the way Game printed it before events existed
+    """
+    kind = event['event']
+    if kind == 'action':
+        print(f"{event['agent']} chose {event['action']}")
+    elif kind == 'round_end':
+        print(f"-----")
+    elif kind == 'error':
+        print(event['message'])
+    elif kind == 'episode_start':
+        print(f"***********  starting a {event['name']} round!  ************ \n \n")
+    elif kind == 'episode_end':
+        if event['swapped']:
+            print(f'***********  end of round!  ************ \n \n')
+    elif kind == 'state':
+        print(event['state'])
+    elif kind == 'game_end':
+        print(f'end of game!')
+    elif kind == 'timing':
+        print(format_summary(event['summary']))
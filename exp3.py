@@ -1,6 +1,20 @@
 IDS = ["Your IDS here"]
 from simulator import Simulator
+from action_codec import COLLECT
+from deadline import Deadline, anytime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+import math
 import random
+import time
+
+EXPLORATION = math.sqrt(2)
+ROLLOUT_ROUNDS = 10
+ITERATIONS = 1000
+PARALLEL_MARGIN = 0.1
+VIRTUAL_LOSS = 1.0
+WIDENING_CONSTANT = 1.0
+WIDENING_SAMPLES = 10
 
 
 class Agent:
@@ -13,47 +27,577 @@ class Agent:
             if ship['player'] == player_number:
                 self.my_ships.append(ship_name)
 
-    def act(self, state):
+    def act(self, state, deadline=None):
         raise NotImplementedError
 
 
 class UCTNode:
     """
-    A class for a single node. not mandatory to use but may help you.
+    A decision point of our player. Holds the statistics of every legal joint action (packed by Simulator.codec)
+    and the children reached by them, keyed by (action code, state key), since the same action can lead to
+    different states through the opponent, the treasure spawns and the marines.
+    In factored search, ship_actions holds the atomic action codes of each of our ships, with their own statistics,
+    and the joint actions are added to actions (and positions) as they are chosen.
+    Nodes are recycled by a NodePool, so they have no attribute dict and are reset instead of rebuilt.
     """
+    __slots__ = ('key', 'actions', 'visits', 'values', 'tried', 'total', 'children', 'positions', 'ship_actions',
+                 'ship_visits', 'ship_values')
+
     def __init__(self):
-        raise NotImplementedError
+        self.children = {}
+        self.positions = {}
+        self.reset(None, [])
 
+    def reset(self, key, actions, ship_actions=None):
+        self.key = key
+        self.actions = actions
+        self.visits = [0] * len(actions)
+        self.values = [0.0] * len(actions)
+        self.tried = 0
+        self.total = 0
+        self.children.clear()
+        self.positions.clear()
+        self.ship_actions = ship_actions
+        if ship_actions is None:
+            self.ship_visits = self.ship_values = None
+        else:
+            self.ship_visits = [[0] * len(codes) for codes in ship_actions]
+            self.ship_values = [[0.0] * len(codes) for codes in ship_actions]
 
-class UCTTree:
+
+class NodePool:
     """
-    A class for a Tree. not mandatory to use but may help you.
+    Free list of UCTNode objects. Released subtrees are reused by later searches instead of being collected.
     """
     def __init__(self):
-        raise NotImplementedError
+        self._free = []
+
+    def acquire(self, key, actions, ship_actions=None):
+        node = self._free.pop() if self._free else UCTNode()
+        node.reset(key, actions, ship_actions)
+        return node
+
+    def release(self, node):
+        """
+        Returns node and all of its descendants to the pool
+        """
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            stack.extend(node.children.values())
+            node.children.clear()
+            self._free.append(node)
+
+
+class UCTTree:
+    """
+    A search tree whose nodes come from a NodePool
+    """
+    def __init__(self, pool=None):
+        self.pool = pool or NodePool()
+        self.root = None
+        self.size = 0
+
+    def new_root(self, key, actions, ship_actions=None):
+        self.clear()
+        self.root = self.pool.acquire(key, actions, ship_actions)
+        self.size = 1
+        return self.root
+
+    def add_child(self, parent, code, key, actions, ship_actions=None):
+        child = self.pool.acquire(key, actions, ship_actions)
+        parent.children[(code, key)] = child
+        self.size += 1
+        return child
+
+    def reroot(self, code, key):
+        """
+        Keeps the subtree that action code led to when the game reached the state with key, and frees the rest.
+        Returns the new root, or None (and an empty tree) when that outcome was never sampled.
+        """
+        child = self.root.children.pop((code, key), None) if self.root is not None else None
+        self.clear()
+        if child is not None:
+            self.root = child
+            stack = [child]
+            while stack:
+                node = stack.pop()
+                self.size += 1
+                stack.extend(node.children.values())
+        return child
+
+    def clear(self):
+        if self.root is not None:
+            self.pool.release(self.root)
+        self.root = None
+        self.size = 0
 
 
 class UCTAgent:
+    """
+    Monte Carlo tree search with UCB1 over our joint actions.
+    The opponent, the treasure spawns and the marines are sampled by the simulator between our decisions,
+    and leaves are evaluated by rollouts of ROLLOUT_ROUNDS rounds with a greedy random policy for both players.
+    Values are our score minus the opponent's score from the root on.
+    With reuse_tree, the subtree of the state actually reached is kept from the previous turn.
+    With workers > 0, as many worker processes grow their own trees from the same root alongside ours
+    (root parallelization), and the action is chosen by the visits of all trees together. Call close() to stop them.
+    With batch_size > 0, batch_size leaves are selected under virtual loss and their rollouts are played together
+    by a batch_simulator.BatchSimulator (needs NumPy).
+    For larger fleets, factored runs a UCB1 bandit per ship at every node instead of one over the joint actions,
+    and widening (an exponent, e.g. 0.5) makes a node consider only ceil(WIDENING_CONSTANT * visits ** widening)
+    joint actions, starting from the rollout policy's and adding sampled ones as its visits grow, so the joint
+    actions are never enumerated.
+    """
     def __init__(self, initial_state, player_number):
         self.ids = IDS
         self.player_number = player_number
+        self.opponent_number = 3 - player_number
         self.my_ships = []
         self.simulator = Simulator(initial_state)
         for ship_name, ship in initial_state['pirate_ships'].items():
             if ship['player'] == player_number:
                 self.my_ships.append(ship_name)
+        self.rounds_to_go = initial_state['turns to go']
+        self.tree = UCTTree()
+        self.reuse_tree = True
+        self.iterations = ITERATIONS
+        self.workers = 0
+        self.batch_size = 0
+        self.factored = False
+        self.widening = None
+        self._batch_simulator = None
+        self._initial_state = initial_state
+        self._executor = None
+        self._last_code = None
+        self._scale = 1.0
+        self._base_distance = self._distances_to_base()
+
+    def _distances_to_base(self):
+        base = self.simulator.base_location
+        distances = {base: 0}
+        queue = deque([base])
+        while queue:
+            location = queue.popleft()
+            for neighbor in self.simulator.neighbors(location):
+                if neighbor not in distances:
+                    distances[neighbor] = distances[location] + 1
+                    queue.append(neighbor)
+        return distances
+
+    def _root_snapshot(self, state):
+        """
+        The simulator snapshot of our decision point. The state passed to act() does not count the turns,
+        so the agent counts the rounds itself.
+        """
+        turns_to_go = 2 * self.rounds_to_go - (self.player_number - 1)
+        return state, {'player 1': 0, 'player 2': 0}, turns_to_go, self.rounds_to_go
+
+    def _game_over(self):
+        return self.simulator.rounds_to_go <= 0
+
+    def _return(self):
+        score = self.simulator.score
+        return score[f'player {self.player_number}'] - score[f'player {self.opponent_number}']
+
+    def _legal_codes(self):
+        codes = list(self.simulator.legal_joint_action_codes(self.player_number))
+        random.shuffle(codes)
+        return codes
+
+    def _node_actions(self):
+        """
+        The actions and ship actions of a new node at the current state
+        """
+        if self._game_over():
+            return [], None
+        if self.factored:
+            simulator = self.simulator
+            ship_actions = []
+            for ship_name in simulator.codec.player_ships[self.player_number]:
+                location = simulator.state['pirate_ships'][ship_name]['location']
+                codes = [simulator.codec.encode_atomic(atomic_action, location)
+                         for atomic_action in simulator.legal_atomic_actions(ship_name)]
+                random.shuffle(codes)
+                ship_actions.append(codes)
+            return [], ship_actions
+        if self.widening is not None:
+            return [self.simulator.codec.encode(self._policy_action(self.player_number), self.simulator.state)], None
+        return self._legal_codes(), None
+
+    def _has_choice(self):
+        return any(len(self.simulator.legal_atomic_actions(ship_name)) > 1
+                   for ship_name in self.simulator.codec.player_ships[self.player_number])
+
+    def _sample_code(self):
+        """
+        A uniformly random legal joint action of ours, without collecting a treasure twice
+        """
+        simulator = self.simulator
+        codes = {}
+        collected = set()
+        for ship_name in simulator.codec.player_ships[self.player_number]:
+            atomic_action = random.choice([atomic_action for atomic_action in simulator.legal_atomic_actions(ship_name)
+                                           if atomic_action[0] != 'collect' or atomic_action[2] not in collected])
+            if atomic_action[0] == 'collect':
+                collected.add(atomic_action[2])
+            codes[ship_name] = simulator.codec.encode_atomic(
+                atomic_action, simulator.state['pirate_ships'][ship_name]['location'])
+        return simulator.codec.pack(codes, self.player_number)
+
+    def _widen(self, node):
+        """
+        Adds a sampled joint action to node when its visits allow one more, returns whether one was added
+        """
+        if len(node.actions) >= math.ceil(WIDENING_CONSTANT * (node.total + 1) ** self.widening):
+            return False
+        for _ in range(WIDENING_SAMPLES):
+            code = self._sample_code()
+            if code not in node.actions:
+                node.actions.append(code)
+                node.visits.append(0)
+                node.values.append(0.0)
+                return True
+        return False
+
+    def _policy_action(self, player):
+        """
+        The rollout policy: deposit, collect a treasure no other ship collects, head to the base when holding a
+        treasure, otherwise a random legal atomic action
+        """
+        simulator = self.simulator
+        action = []
+        collected = set()
+        for ship_name in simulator.codec.player_ships[player]:
+            choices = simulator.legal_atomic_actions(ship_name)
+            chosen = None
+            for atomic_action in choices:
+                if atomic_action[0] == 'deposit':
+                    chosen = atomic_action
+                    break
+                if atomic_action[0] == 'collect' and chosen is None and atomic_action[2] not in collected:
+                    chosen = atomic_action
+            if chosen is None:
+                ship = simulator.state['pirate_ships'][ship_name]
+                if ship['capacity'] < 2:
+                    distance = self._base_distance.get(ship['location'])
+                    closer = [atomic_action for atomic_action in choices if atomic_action[0] == 'sail' and
+                              distance is not None and self._base_distance.get(atomic_action[2], distance) < distance]
+                    if closer:
+                        chosen = random.choice(closer)
+                if chosen is None:
+                    chosen = random.choice([atomic_action for atomic_action in choices
+                                            if atomic_action[0] != 'collect'])
+            elif chosen[0] == 'collect':
+                collected.add(chosen[2])
+            action.append(chosen)
+        return tuple(action)
+
+    def _play_turn(self, player, action=None):
+        """
+        Plays the turn of player (the policy action when action is None), ending the round after player 2
+        """
+        self.simulator.act_unchecked(action or self._policy_action(player), player)
+        if player == 2:
+            self.simulator.end_round()
+
+    def _advance(self, node, index, ship_indices=None):
+        """
+        Plays node.actions[index] and the turns until our next decision point (or the end of the game).
+        Returns the path entry of the step: the node, the action index, the return before the action and the
+        indices of the ship actions in factored search.
+        """
+        before = self._return()
+        simulator = self.simulator
+        simulator.act_encoded(node.actions[index], self.player_number, check=False)
+        if self.player_number == 1:
+            self._play_turn(2)
+        else:
+            simulator.end_round()
+            if not self._game_over():
+                self._play_turn(1)
+        return node, index, before, ship_indices
+
+    def _ucb(self, node):
+        log_total = math.log(node.total)
+        best_index, best_value = 0, -math.inf
+        for index, (visits, value) in enumerate(zip(node.visits, node.values)):
+            ucb = value / (visits * self._scale) + EXPLORATION * math.sqrt(log_total / visits)
+            if ucb > best_value:
+                best_index, best_value = index, ucb
+        return best_index
+
+    def _factored_choice(self, node):
+        """
+        Picks the action of every ship by its own UCB1 (untried actions first, no treasure collected twice).
+        Returns the index of the joint action in node.actions, adding it when new, and the ship action indices.
+        """
+        codec = self.simulator.codec
+        log_total = math.log(node.total) if node.total else 0.0
+        codes = {}
+        ship_indices = []
+        collected = set()
+        for ship_name, actions, visits, values in zip(codec.player_ships[self.player_number], node.ship_actions,
+                                                       node.ship_visits, node.ship_values):
+            best_index, best_value = 0, -math.inf
+            for index, code in enumerate(actions):
+                if code in collected:
+                    continue
+                if visits[index] == 0:
+                    best_index = index
+                    break
+                ucb = values[index] / (visits[index] * self._scale) + EXPLORATION * math.sqrt(log_total / visits[index])
+                if ucb > best_value:
+                    best_index, best_value = index, ucb
+            code = actions[best_index]
+            if COLLECT <= code < codec.deposit_base:
+                collected.add(code)
+            codes[ship_name] = code
+            ship_indices.append(best_index)
+        joint = codec.pack(codes, self.player_number)
+        index = node.positions.get(joint)
+        if index is None:
+            index = node.positions[joint] = len(node.actions)
+            node.actions.append(joint)
+            node.visits.append(0)
+            node.values.append(0.0)
+        return index, ship_indices
 
     def selection(self, UCT_tree):
-        raise NotImplementedError
+        """
+        Descends from the root by UCB1 while the nodes are fully expanded, playing the actions in the simulator.
+        Returns the node reached (None when an action led to an outcome that is not in the tree yet) and the path.
+        """
+        node = UCT_tree.root
+        path = []
+        while not self._game_over():
+            if node.ship_actions is not None:
+                path.append(self._advance(node, *self._factored_choice(node)))
+            elif node.tried < len(node.actions) or (self.widening is not None and self._widen(node)):
+                break
+            else:
+                path.append(self._advance(node, self._ucb(node)))
+            node = node.children.get((node.actions[path[-1][1]], self.simulator.state_key()))
+            if node is None:
+                break
+        return node, path
 
-    def expansion(self, UCT_tree, parent_node):
-        raise NotImplementedError
+    def expansion(self, UCT_tree, parent_node, path):
+        """
+        Tries the next untried action of parent_node, or when parent_node is None adds the outcome selection()
+        reached, and returns the new node
+        """
+        if parent_node is not None:
+            if self._game_over():
+                return parent_node
+            index = parent_node.tried
+            parent_node.tried += 1
+            path.append(self._advance(parent_node, index))
+        node, index = path[-1][:2]
+        return UCT_tree.add_child(node, node.actions[index], self.simulator.state_key(), *self._node_actions())
 
     def simulation(self):
-        raise NotImplementedError
+        """
+        Plays the rollout policy for ROLLOUT_ROUNDS rounds from our decision point, returns the return of the playout
+        """
+        player = self.player_number
+        rounds = 0
+        while not self._game_over() and rounds < ROLLOUT_ROUNDS:
+            self._play_turn(player)
+            if player == 2:
+                rounds += 1
+            player = 3 - player
+        return self._return()
 
-    def backpropagation(self, simulation_result):
-        raise NotImplementedError
+    def backpropagation(self, simulation_result, path, virtual_loss=None):
+        """
+        With virtual_loss, the path was already counted by _add_virtual_loss() and only its value is corrected
+        """
+        self._scale = max(self._scale, abs(simulation_result))
+        for entry in path:
+            if virtual_loss is None:
+                self._record(entry, 1, simulation_result - entry[2])
+            else:
+                self._record(entry, 0, simulation_result - entry[2] + virtual_loss)
 
-    def act(self, state):
-        raise NotImplementedError
+    def _add_virtual_loss(self, path, virtual_loss):
+        """
+        Counts a lost visit on the path, so the next selections of the same batch spread to other leaves
+        """
+        for entry in path:
+            self._record(entry, 1, -virtual_loss)
+
+    @staticmethod
+    def _record(entry, visits, value):
+        node, index, _, ship_indices = entry
+        node.total += visits
+        node.visits[index] += visits
+        node.values[index] += value
+        if ship_indices is not None:
+            for ship, ship_index in enumerate(ship_indices):
+                node.ship_visits[ship][ship_index] += visits
+                node.ship_values[ship][ship_index] += value
+
+    def _iterate(self, root_snapshot):
+        self.simulator.restore(root_snapshot)
+        node, path = self.selection(self.tree)
+        self.expansion(self.tree, node, path)
+        self.backpropagation(self.simulation(), path)
+
+    def _iterate_batch(self, root_snapshot):
+        virtual_loss = VIRTUAL_LOSS * self._scale
+        leaves = []
+        for _ in range(self.batch_size):
+            self.simulator.restore(root_snapshot)
+            node, path = self.selection(self.tree)
+            self.expansion(self.tree, node, path)
+            self._add_virtual_loss(path, virtual_loss)
+            leaves.append((path, self._return(), self.simulator.rounds_to_go, self.simulator.state))
+        for (path, _, _, _), result in zip(leaves, self._batch_simulation(leaves)):
+            self.backpropagation(result, path, virtual_loss)
+
+    def _batch_simulation(self, leaves):
+        """
+        simulation() for all the leaves at once, with the greedy policy of BatchSimulator. Leaves are (path,
+        return, rounds to go, state) at our decision points.
+        """
+        results = [leaf_return for _, leaf_return, _, _ in leaves]
+        playing = [i for i, (_, _, rounds_to_go, _) in enumerate(leaves) if rounds_to_go > 0]
+        if not playing:
+            return results
+        states = [leaves[i][3] for i in playing]
+        if self._batch_simulator is None:
+            from batch_simulator import BatchSimulator
+            self._batch_simulator = BatchSimulator(states, random.getrandbits(32))
+        else:
+            self._batch_simulator.load(states)
+        batch = self._batch_simulator
+        rounds = [min(ROLLOUT_ROUNDS, leaves[i][2]) for i in playing]
+        if self.player_number == 2:
+            # player 1 already acted in the round of the leaf
+            batch.apply_actions(2, batch.random_actions(2, greedy=True))
+            batch.add_treasure()
+            batch.end_round()
+            rounds = [r - 1 for r in rounds]
+        scores = batch.rollout(rounds, greedy=True)
+        for i, score in zip(playing, scores):
+            results[i] += int(score[self.player_number - 1] - score[self.opponent_number - 1])
+        return results
+
+    def _prepare_root(self, state):
+        """
+        Sets the simulator to state and the tree root to its node, returns the root snapshot
+        """
+        root_snapshot = self._root_snapshot(state)
+        self.simulator.restore(root_snapshot)
+        key = self.simulator.state_key()
+        root = None
+        if self.reuse_tree and self._last_code is not None:
+            root = self.tree.reroot(self._last_code, key)
+        if root is None:
+            self.tree.new_root(key, *self._node_actions())
+        return root_snapshot
+
+    def _search(self, root_snapshot, deadline):
+        if self.batch_size:
+            iterate = lambda: self._iterate_batch(root_snapshot)
+            max_iterations = -(-self.iterations // self.batch_size)
+        else:
+            iterate = lambda: self._iterate(root_snapshot)
+            max_iterations = self.iterations
+        anytime(iterate, lambda: None, deadline, max_iterations=None if deadline is not None else max_iterations)
+
+    def _root_stats(self):
+        """
+        action code -> [visits, value] of the root
+        """
+        root = self.tree.root
+        return {code: [visits, value] for code, visits, value in zip(root.actions, root.visits, root.values)}
+
+    def _submit_searches(self, state, deadline):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self._initial_state, self.player_number))
+        # an absolute end, so that time spent starting the worker or waiting in the queue counts against the turn
+        end = None if deadline is None else time.time() + deadline.remaining()
+        settings = {'iterations': self.iterations, 'batch_size': self.batch_size, 'factored': self.factored,
+                    'widening': self.widening}
+        try:
+            return [self._executor.submit(_worker_search, state, self.rounds_to_go, self._last_code, end, settings,
+                                          random.getrandbits(32)) for _ in range(self.workers)]
+        except RuntimeError:
+            # a broken pool, it is recreated on the next turn
+            self.close()
+            return []
+
+    def act(self, state, deadline=None):
+        """
+        Searches until the deadline (self.iterations iterations without one) and plays the most visited action
+        """
+        root_snapshot = self._prepare_root(state)
+        if self._has_choice():
+            if self.workers:
+                if deadline is not None:
+                    deadline = Deadline(deadline.remaining() - PARALLEL_MARGIN)
+                futures = self._submit_searches(state, deadline)
+                self._search(root_snapshot, deadline)
+                stats = self._root_stats()
+                done, late = wait(futures, timeout=None if deadline is None else max(deadline.remaining(), 0))
+                for future in late:
+                    future.cancel()
+                for future in done:
+                    try:
+                        worker_stats = future.result()
+                    except Exception:
+                        # e.g. a worker process died, the action is chosen by the other trees
+                        continue
+                    for code, (visits, value) in worker_stats.items():
+                        merged = stats.setdefault(code, [0, 0.0])
+                        merged[0] += visits
+                        merged[1] += value
+            else:
+                self._search(root_snapshot, deadline)
+                stats = self._root_stats()
+            code = max(stats, key=lambda code: stats[code])
+        else:
+            code = self.simulator.codec.encode(self._policy_action(self.player_number), self.simulator.state)
+        self.simulator.restore(root_snapshot)
+        self.rounds_to_go -= 1
+        self._last_code = code
+        return self.simulator.codec.decode(code, self.player_number, self.simulator.state)
+
+    def close(self):
+        """
+        Stops the worker processes of root parallel search
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_worker_agent = None
+
+
+def _init_worker(initial_state, player_number):
+    global _worker_agent
+    _worker_agent = UCTAgent(initial_state, player_number)
+
+
+def _worker_search(state, rounds_to_go, last_code, end, settings, seed):
+    """
+    Grows the tree of the worker process from state with the search settings of the agent until end (a time.time()),
+    returns its root stats. Nothing is searched when end has already passed.
+    """
+    seconds = None if end is None else end - time.time()
+    if seconds is not None and seconds <= 0:
+        return {}
+    random.seed(seed)
+    agent = _worker_agent
+    agent.rounds_to_go = rounds_to_go
+    agent._last_code = last_code
+    for name, value in settings.items():
+        setattr(agent, name, value)
+    root_snapshot = agent._prepare_root(state)
+    if agent._has_choice():
+        agent._search(root_snapshot, None if seconds is None else Deadline(seconds))
+    return agent._root_stats()
@@ -0,0 +1,96 @@
+from multiprocessing import shared_memory
+import importlib
+import multiprocessing
+
+from compact_state import CompactState
+from deadline import Deadline, accepts_deadline
+
+
+class IsolatedAgent:
+    """
+    Runs an agent in its own worker process.
+    Each turn the state is written into shared memory in the CompactState encoding, and the worker is killed when
+    it does not answer before the deadline, so a runaway agent cannot stall the game.
+    Timeouts and errors of the agent are raised as ValueError, like Game does for agents in the same process.
+    """
+    def __init__(self, module_name, initial_state, player_number, uct_flag=False, constructor_timeout=60,
+                 action_timeout=5):
+        self.player_number = player_number
+        self.action_timeout = action_timeout
+        self._compact = CompactState.from_dict(initial_state)
+        self._memory = shared_memory.SharedMemory(create=True, size=self._compact.packed_size())
+        self._connection, worker_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve, args=(module_name, uct_flag, initial_state, player_number, self._memory.name,
+                                 worker_connection), daemon=True)
+        self._process.start()
+        self._closed = False
+        try:
+            self.ids = self._receive(constructor_timeout, 'constructor')
+        except ValueError:
+            self.close()
+            raise
+
+    def _receive(self, timeout, what):
+        if not self._connection.poll(max(timeout, 0)):
+            self.close()
+            raise ValueError(f'agent timed out on {what}!')
+        kind, payload = self._connection.recv()
+        if kind == 'error':
+            raise ValueError(f'agent failed on {what}: {payload}')
+        return payload
+
+    def act(self, state, deadline=None):
+        if self._closed or not self._process.is_alive():
+            raise ValueError(f'agent of player {self.player_number} is not running!')
+        if deadline is None:
+            deadline = Deadline(self.action_timeout)
+        self._compact.update(state)
+        self._compact.pack_into(self._memory.buf)
+        self._connection.send(deadline.remaining())
+        return self._receive(deadline.remaining(), 'action')
+
+    def close(self):
+        """
+        Stops the worker and frees the shared memory
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._process.is_alive():
+            self._process.kill()
+        self._process.join()
+        self._connection.close()
+        self._memory.close()
+        self._memory.unlink()
+
+
+def _serve(module_name, uct_flag, initial_state, player_number, memory_name, connection):
+    """
+    The worker process loop: receives the seconds left for the turn, reads the state from shared memory and sends
+    back the action
+    """
+    try:
+        module = importlib.import_module(module_name)
+        agent = module.UCTAgent(initial_state, player_number) if uct_flag else module.Agent(initial_state,
+                                                                                           player_number)
+    except Exception as e:
+        connection.send(('error', repr(e)))
+        return
+    memory = shared_memory.SharedMemory(name=memory_name)
+    compact = CompactState.from_dict(initial_state)
+    game_map = initial_state['map']
+    connection.send(('ready', agent.ids))
+    while True:
+        seconds = connection.recv()
+        compact.unpack_from(memory.buf)
+        state = compact.to_dict(game_map)
+        try:
+            if accepts_deadline(agent):
+                action = agent.act(state, deadline=Deadline(seconds))
+            else:
+                action = agent.act(state)
+        except Exception as e:
+            connection.send(('error', repr(e)))
+            continue
+        connection.send(('action', action))
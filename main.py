@@ -1,4 +1,9 @@
 from simulator import Simulator
+from deadline import Deadline, accepts_deadline
+from event_log import print_event
+from isolation import IsolatedAgent
+from replay import ReplayWriter
+from timing import PhaseTimer, ROUND
 import exp3
 import sample_agent
 from copy import deepcopy
@@ -14,20 +19,40 @@ class Game:
     """
     This class plays the game for you. You are given a sample agent to play against.
     """
-    def __init__(self, an_input):
+    def __init__(self, an_input, quiet=False, event_log=None, timing=False):
+        """
+        :param quiet: do not print the game
+        :param event_log: an event_log.EventLog that records the game events
+        :param timing: record the time spent in each phase of each turn, reported at the end of play_game
+        """
         self.initial_state = deepcopy(an_input)
         self.simulator = Simulator(self.initial_state)
         self.ids = []
         self.agents = []
         self.score = [0, 0]
+        self.swapped = False
+        self.episode = 0
+        self.quiet = quiet
+        self.event_log = event_log
+        self.timer = PhaseTimer() if timing else None
+
+    def emit(self, event):
+        if self.event_log is not None:
+            self.event_log.emit(event)
+        if not self.quiet:
+            print_event(event)
 
-    def initiate_agent(self, module, player_number, UCT_flag=False):
+    def initiate_agent(self, module, player_number, UCT_flag=False, isolated=False):
         """
         :param UCT_flag: Uses UCT_Agent instead of general one
+        :param isolated: runs the agent in its own process, killed when it exceeds ACTION_TIMEOUT
         :return: agent
         """
         start = time.time()
-        if UCT_flag:
+        if isolated:
+            agent = IsolatedAgent(module.__name__, self.initial_state, player_number, UCT_flag, CONSTRUCTOR_TIMEOUT,
+                                  ACTION_TIMEOUT)
+        elif UCT_flag:
             agent = module.UCTAgent(self.initial_state, player_number)
         else:
             agent = module.Agent(self.initial_state, player_number)
@@ -35,68 +60,148 @@ class Game:
             raise ValueError(f'agent timed out on constructor!')
         return agent
 
-    def get_action(self, agent, player):
+    def get_action(self, agent, player, turn=None):
+        """
+        Agents whose act() has a deadline parameter get a deadline.Deadline of ACTION_TIMEOUT seconds
+        """
         start = time.time()
-        action = agent.act(self.simulator.get_state())
+        start_ns = time.perf_counter_ns()
+        if accepts_deadline(agent):
+            action = agent.act(self.simulator.get_state(), deadline=Deadline(ACTION_TIMEOUT))
+        else:
+            action = agent.act(self.simulator.get_state())
+        if self.timer is not None:
+            self.timer.add(self.episode, turn, str(self.ids[player]), 'act', time.perf_counter_ns() - start_ns)
         finish = time.time()
         if finish - start > ACTION_TIMEOUT:
-            self.score[player] -= PENALTY
+            self.score[self._score_slot(player)] -= PENALTY
             raise ValueError(f'{self.ids[player]} timed out on action!')
         return action
 
-    def play_episode(self, swapped=False):
+    def _score_slot(self, number):
+        """
+        The index in self.score of the agent seated at self.agents[number], self.score is kept in the seat order
+        of the first episode
+        """
+        return 1 - number if self.swapped else number
+
+    def _act(self, action, player, turn):
+        """
+        simulator.act(), timing the legality check, the action and the treasure spawn when timing is on
+        """
+        if self.timer is None:
+            return self.simulator.act(action, player)
+        agent = str(self.ids[player - 1])
+        start = time.perf_counter_ns()
+        legal = self.simulator.check_if_action_legal(action, player)
+        checked = time.perf_counter_ns()
+        self.timer.add(self.episode, turn, agent, 'legality', checked - start)
+        if not legal:
+            raise ValueError(f"Illegal action!")
+        self.simulator.apply_action(action, player)
+        applied = time.perf_counter_ns()
+        self.timer.add(self.episode, turn, agent, 'apply', applied - checked)
+        spawned = self.simulator.add_treasure()
+        self.timer.add(self.episode, turn, agent, 'spawn', time.perf_counter_ns() - applied)
+        return spawned
+
+    def play_episode(self, swapped=False, replay_path=None):
+        """
+        :param replay_path: records the episode into this replay file
+        """
+        self.swapped = swapped
+        self.episode += 1
+        recorder = None
+        if replay_path is not None:
+            recorder = ReplayWriter(replay_path, self.simulator.get_state())
+        try:
+            self._play_rounds(swapped, recorder)
+        finally:
+            if recorder is not None:
+                recorder.close(self.simulator.get_state())
+            for agent in self.agents:
+                if hasattr(agent, 'close'):
+                    agent.close()
+
+    def _play_rounds(self, swapped, recorder):
         length_of_episode = self.initial_state["turns to go"]
+        score = self.simulator.get_score()
         for i in range(length_of_episode):
             for number, agent in enumerate(self.agents):
                 try:
-                    action = self.get_action(agent, number)
+                    action = self.get_action(agent, number, i)
                 except (AssertionError, ValueError) as e:
-                    print(e)
-                    self.score[number] -= PENALTY
+                    self.emit({'event': 'error', 'turn': i, 'player': number + 1, 'message': str(e)})
+                    self.score[self._score_slot(number)] -= PENALTY
                     return
+                player_score = score[f'player {number + 1}']
+                if recorder is not None:
+                    locations = {name: ship['location'] for name, ship in self.simulator.state['pirate_ships'].items()}
                 try:
-                    self.simulator.act(action, number + 1)
+                    spawned = self._act(action, number + 1, i)
                 except (AssertionError, ValueError):
-                    print(f'{agent.ids} chose illegal action!')
-                    self.score[number] -= PENALTY
+                    self.emit({'event': 'error', 'turn': i, 'player': number + 1,
+                               'message': f'{agent.ids} chose illegal action!'})
+                    self.score[self._score_slot(number)] -= PENALTY
                     return
-                print(f"{agent.ids} chose {action}")
-            self.simulator.check_collision_with_marines()
+                if recorder is not None:
+                    recorder.record_act(number + 1, action, locations, spawned, self.simulator.get_state())
+                self.emit({'event': 'action', 'turn': i, 'player': number + 1, 'agent': agent.ids, 'action': action,
+                           'score_delta': score[f'player {number + 1}'] - player_score})
+            scores_before = score['player 1'], score['player 2']
+            start = time.perf_counter_ns()
+            collided = self.simulator.check_collision_with_marines()
+            collision_checked = time.perf_counter_ns()
             self.simulator.move_marines()
-            print(f"-----")
+            if self.timer is not None:
+                self.timer.add(self.episode, i, ROUND, 'collision', collision_checked - start)
+                self.timer.add(self.episode, i, ROUND, 'marines', time.perf_counter_ns() - collision_checked)
+            if collided:
+                self.emit({'event': 'collision', 'turn': i, 'ships': collided,
+                           'score_delta': [score['player 1'] - scores_before[0], score['player 2'] - scores_before[1]]})
+            if recorder is not None:
+                recorder.record_round_end(self.simulator.get_state())
+            self.emit({'event': 'round_end', 'turn': i})
         if not swapped:
             self.score[0] += self.simulator.get_score()['player 1']
             self.score[1] += self.simulator.get_score()['player 2']
         else:
             self.score[0] += self.simulator.get_score()['player 2']
             self.score[1] += self.simulator.get_score()['player 1']
-            print(f'***********  end of round!  ************ \n \n')
+        self.emit({'event': 'episode_end', 'swapped': swapped, 'score': [score['player 1'], score['player 2']]})
+        if self.event_log is not None:
+            self.event_log.flush()
 
-    def play_game(self):
+    def play_game(self, replay_prefix=None):
         """
         When initiating the agents in this function, you can set UCT_flag to True in initiate_agent(), when not using
         the general agent. You may also use an agent of your own, instead of sample agent.
+        :param replay_prefix: records the two episodes into replay_prefix_1.replay and replay_prefix_2.replay
         """
-        print(f'***********  starting a first round!  ************ \n \n')
+        self.emit({'event': 'episode_start', 'name': 'first'})
         self.agents = [self.initiate_agent(exp3, 1),
                        self.initiate_agent(sample_agent, 2)]
         self.ids = ['Your agent', 'Rival agent']
-        self.play_episode()
-        print(self.simulator.state)
+        self.play_episode(replay_path=replay_prefix and f'{replay_prefix}_1.replay')
+        self.emit({'event': 'state', 'state': self.simulator.state})
 
-        print(f'***********  starting a second round!  ************ \n \n')
+        self.emit({'event': 'episode_start', 'name': 'second'})
         self.simulator = Simulator(self.initial_state)
 
         self.agents = [self.initiate_agent(sample_agent, 1),
                        self.initiate_agent(exp3, 2)]
         self.ids = ['Rival agent', 'Your agent']
-        self.play_episode(swapped=True)
-        print(f'end of game!')
+        self.play_episode(swapped=True, replay_path=replay_prefix and f'{replay_prefix}_2.replay')
+        self.emit({'event': 'game_end', 'score': self.score})
+        if self.timer is not None:
+            self.emit({'event': 'timing', 'summary': self.timer.summary()})
+        if self.event_log is not None:
+            self.event_log.flush()
         return self.score
 
 
-def main():
-    an_input = {
+def default_input():
+    return {
         "map": [
             ['S', 'S', 'I', 'S', 'S', 'S', 'S'],
             ['S', 'S', 'I', 'S', 'S', 'S', 'S'],
@@ -130,6 +235,10 @@ def main():
                          },
         "turns to go": 200
     }
+
+
+def main():
+    an_input = default_input()
     game = Game(an_input)
     results = game.play_game()
     print(f'Score for {exp3.IDS} is {results[0]}, score for {sample_agent.IDS} is {results[1]}')
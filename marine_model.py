@@ -0,0 +1,106 @@
+_path_distributions = {}
+_models = {}
+
+
+def transition_matrix(path_length):
+    """
+    The transition matrix of Simulator.move_marines over the indices of a path: stay or step to a neighbor index,
+    uniformly among the indices allowed.
+    """
+    matrix = [[0.0] * path_length for _ in range(path_length)]
+    for index in range(path_length):
+        if path_length == 1:
+            moves = [0]
+        elif index == 0:
+            moves = [0, 1]
+        elif index == path_length - 1:
+            moves = [index, index - 1]
+        else:
+            moves = [index - 1, index, index + 1]
+        for move in moves:
+            matrix[index][move] += 1 / len(moves)
+    return matrix
+
+
+def index_distributions(path_length, horizon):
+    """
+    distributions[start][t][index] is the probability that a marine starting at start is at index after t moves,
+    for t up to horizon. Cached per path length and extended when a longer horizon is asked for.
+    """
+    distributions = _path_distributions.get(path_length)
+    if distributions is None:
+        distributions = _path_distributions[path_length] = [
+            [[1.0 if index == start else 0.0 for index in range(path_length)]] for start in range(path_length)]
+    if len(distributions[0]) > horizon:
+        return distributions
+    matrix = transition_matrix(path_length)
+    for per_start in distributions:
+        while len(per_start) <= horizon:
+            previous = per_start[-1]
+            current = [0.0] * path_length
+            for index, probability in enumerate(previous):
+                if probability:
+                    for move, step_probability in enumerate(matrix[index]):
+                        if step_probability:
+                            current[move] += probability * step_probability
+            per_start.append(current)
+    return distributions
+
+
+class MarineOccupancy:
+    """
+    Exact probabilities that map cells are occupied by a marine, t calls of move_marines() from now.
+    Use occupancy_model() to share one instance per map.
+    """
+    def __init__(self, state, horizon=None):
+        self.marine_names = tuple(state['marine_ships'].keys())
+        self.paths = tuple(tuple(tuple(cell) for cell in marine['path']) for marine in state['marine_ships'].values())
+        self.horizon = state['turns to go'] if horizon is None else horizon
+        self._distributions = [index_distributions(len(path), self.horizon) for path in self.paths]
+        self._maps = {}
+
+    def marine_cells(self, marine, start, t):
+        """
+        cell -> probability that the marine_names[marine] marine, now at index start of its path, is there after t moves
+        """
+        cells = {}
+        path = self.paths[marine]
+        for index, probability in enumerate(self._distributions[marine][start][t]):
+            if probability:
+                cells[path[index]] = cells.get(path[index], 0.0) + probability
+        return cells
+
+    def occupancy(self, indices, t):
+        """
+        cell -> probability that at least one marine is there after t moves, given the current path indices
+        (in the order of marine_names). Cells that cannot be reached are left out.
+        """
+        key = (tuple(indices), t)
+        cells = self._maps.get(key)
+        if cells is None:
+            if t > self.horizon:
+                raise ValueError(f"horizon {t} is beyond {self.horizon}")
+            free = {}
+            for marine, start in enumerate(indices):
+                for cell, probability in self.marine_cells(marine, start, t).items():
+                    free[cell] = free.get(cell, 1.0) * (1 - probability)
+            cells = self._maps[key] = {cell: 1 - probability for cell, probability in free.items()}
+        return cells
+
+    def probability(self, cell, t, indices):
+        return self.occupancy(indices, t).get(tuple(cell), 0.0)
+
+    def state_indices(self, state):
+        return tuple(state['marine_ships'][name]['index'] for name in self.marine_names)
+
+
+def occupancy_model(state):
+    """
+    The MarineOccupancy of the marine paths of the state, cached per map
+    """
+    key = tuple((name, tuple(tuple(cell) for cell in marine['path']))
+                for name, marine in state['marine_ships'].items())
+    model = _models.get(key)
+    if model is None or model.horizon < state['turns to go']:
+        model = _models[key] = MarineOccupancy(state)
+    return model
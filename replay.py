@@ -0,0 +1,173 @@
+import json
+import mmap
+import struct
+
+from simulator import Simulator, input_from_json
+
+MAGIC = b'PRPL'
+VERSION = 1
+HEADER = struct.Struct('<4sBI')
+# flags, treasure slot, row, column, reward of the arrived treasure; the packed action code follows
+ACT = struct.Struct('<BBHHB')
+ACTED = 1
+SPAWNED = 2
+
+
+class ReplayWriter:
+    """
+    Records an episode into a compact binary file: a json header with the initial state, then one fixed size
+    record per round. A round record holds, for each player, the packed action code and the treasure that arrived
+    after it, followed by the marine indices after they moved. A round cut short (an agent failed) is padded with
+    records that did not act.
+    """
+    def __init__(self, path, initial_state):
+        self.simulator = Simulator(initial_state)
+        self.codec = self.simulator.codec
+        self.marine_names = tuple(initial_state['marine_ships'].keys())
+        self.record = RecordLayout(self.codec, len(self.marine_names))
+        header = json.dumps({'initial_state': initial_state}).encode()
+        self._file = open(path, 'wb')
+        self._file.write(HEADER.pack(MAGIC, VERSION, len(header)))
+        self._file.write(header)
+        self._round = []
+
+    def record_act(self, player, action, locations, spawned, state):
+        """
+        locations are the ship locations before the action, spawned the name of the treasure that arrived after it
+        and state the state after it
+        """
+        codes = {atomic_action[1]: self.codec.encode_atomic(atomic_action, locations[atomic_action[1]])
+                 for atomic_action in action}
+        flags, slot, row, col, reward = ACTED, 0, 0, 0, 0
+        if spawned is not None:
+            treasure = state['treasures'][spawned]
+            flags |= SPAWNED
+            slot = self.codec.treasure_index[spawned]
+            (row, col), reward = treasure['location'], treasure['reward']
+        self._round.append(ACT.pack(flags, slot, row, col, reward) +
+                           self.codec.pack(codes, player).to_bytes(self.record.code_width, 'little'))
+
+    def record_round_end(self, state):
+        """
+        state is the state after the marines moved
+        """
+        self._write_round([state['marine_ships'][name]['index'] for name in self.marine_names])
+
+    def _write_round(self, marine_indices):
+        while len(self._round) < 2:
+            self._round.append(bytes(self.record.act_size))
+        self._file.write(b''.join(self._round) + struct.pack(f'<{len(marine_indices)}H', *marine_indices))
+        self._round = []
+
+    def close(self, state=None):
+        """
+        state is needed to pad a round cut short
+        """
+        if self._round:
+            self._write_round([state['marine_ships'][name]['index'] for name in self.marine_names])
+        self._file.close()
+
+
+class RecordLayout:
+    def __init__(self, codec, marines):
+        ships = max([len(ships) for ships in codec.player_ships.values()], default=1)
+        self.code_width = max(1, ((codec.num_actions ** ships - 1).bit_length() + 7) // 8)
+        self.act_size = ACT.size + self.code_width
+        self.round_size = 2 * self.act_size + 2 * marines
+
+
+class Replay:
+    """
+    Reads a replay file through a memory map. Rounds are decoded only when needed, and states are rebuilt by
+    re-simulating from the closest keyframe, a snapshot kept every keyframe_interval rounds.
+    """
+    def __init__(self, path, keyframe_interval=50):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a replay file")
+        header = json.loads(bytes(self._map[HEADER.size:HEADER.size + header_size]))
+        self.initial_state = input_from_json(header['initial_state'])
+        self.simulator = Simulator(self.initial_state)
+        self.codec = self.simulator.codec
+        self.marine_names = tuple(self.initial_state['marine_ships'].keys())
+        self.record = RecordLayout(self.codec, len(self.marine_names))
+        self._start = HEADER.size + header_size
+        self.rounds = (len(self._map) - self._start) // self.record.round_size
+        self.keyframe_interval = keyframe_interval
+        self._keyframes = {0: self.simulator.snapshot()}
+
+    def round(self, number):
+        """
+        The record of a round: a list of (player, action code, arrived treasure or None) for the players that acted,
+        and the marine indices after the round
+        """
+        offset = self._start + number * self.record.round_size
+        acts = []
+        for player in (1, 2):
+            flags, slot, row, col, reward = ACT.unpack_from(self._map, offset)
+            code = int.from_bytes(self._map[offset + ACT.size:offset + self.record.act_size], 'little')
+            offset += self.record.act_size
+            if flags & ACTED:
+                spawn = (self.codec.treasure_names[slot], (row, col), reward) if flags & SPAWNED else None
+                acts.append((player, code, spawn))
+        return acts, struct.unpack_from(f'<{len(self.marine_names)}H', self._map, offset)
+
+    def _apply_act(self, player, code, spawn):
+        """
+        Plays a recorded act on the simulator, returns the decoded action
+        """
+        action = self.codec.decode(code, player, self.simulator.state)
+        self.simulator.apply_action(action, player)
+        if spawn is not None:
+            self.simulator.place_treasure(*spawn)
+        return action
+
+    def _play_round(self, number):
+        acts, marine_indices = self.round(number)
+        for act in acts:
+            self._apply_act(*act)
+        if len(acts) < 2:
+            return
+        self.simulator.check_collision_with_marines()
+        for name, index in zip(self.marine_names, marine_indices):
+            self.simulator.set_marine_index(name, index)
+
+    def actions(self, number):
+        """
+        The decoded joint actions of a round, as (player, action)
+        """
+        self._rebuild(number)
+        return [(act[0], self._apply_act(*act)) for act in self.round(number)[0]]
+
+    def _rebuild(self, rounds):
+        keyframe = rounds - rounds % self.keyframe_interval
+        while keyframe not in self._keyframes:
+            keyframe -= self.keyframe_interval
+        self.simulator.restore(self._keyframes[keyframe])
+        for number in range(keyframe, rounds):
+            self._play_round(number)
+            if (number + 1) % self.keyframe_interval == 0 and number + 1 not in self._keyframes:
+                self._keyframes[number + 1] = self.simulator.snapshot()
+
+    def state_at(self, rounds, player=None):
+        """
+        The state and score after rounds rounds.
+        With player, the state and score that player's agent saw in round number rounds, after the players
+        before it acted: state_at(n, 2) is the state after player 1 moved in round n.
+        """
+        last = self.rounds if player is None else self.rounds - 1
+        if not 0 <= rounds <= last:
+            raise ValueError(f"replay has {self.rounds} rounds")
+        self._rebuild(rounds)
+        if player is not None:
+            for act in self.round(rounds)[0]:
+                if act[0] >= player:
+                    break
+                self._apply_act(*act)
+        return self.simulator.snapshot()[0], dict(self.simulator.score)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
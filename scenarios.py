@@ -0,0 +1,108 @@
+from collections import deque
+import argparse
+import json
+import random
+
+from simulator import TREASURE_NAMES
+
+MAX_TREASURES = 10
+
+
+def generate(rows, cols=None, island_density=0.2, ships_per_player=2, marines=2, treasures=1, turns=100,
+             marine_path_length=6, seed=None):
+    """
+    Generates a valid game input.
+    Every sea cell is reachable from the base (unreachable sea is turned into islands), all ships start at the base,
+    marine paths are walks over adjacent sea cells that avoid the base, and treasures lie on islands next to the sea.
+    """
+    cols = rows if cols is None else cols
+    rng = random.Random(seed)
+    game_map = [['I' if rng.random() < island_density else 'S' for _ in range(cols)] for _ in range(rows)]
+    base = (rng.randrange(rows), rng.randrange(cols))
+    game_map[base[0]][base[1]] = 'B'
+    reachable = _reachable(game_map, base)
+    for x in range(rows):
+        for y in range(cols):
+            if (x, y) not in reachable:
+                game_map[x][y] = 'I'
+
+    pirate_ships = {}
+    for i in range(2 * ships_per_player):
+        pirate_ships[f'pirate_ship_{i + 1}'] = {'location': base, 'capacity': 2, 'player': 1 + i // ships_per_player}
+
+    sea = sorted(reachable - {base})
+    marine_ships = {}
+    for i in range(marines if sea else 0):
+        marine_ships[f'marine_{i + 1}'] = {'index': 0, 'path': _marine_path(game_map, rng.choice(sea),
+                                                                            marine_path_length, base, rng)}
+
+    shores = [(x, y) for x in range(rows) for y in range(cols)
+              if game_map[x][y] == 'I' and any(cell in reachable for cell in _adjacent(x, y, rows, cols))]
+    placed = {}
+    for name, location in zip(TREASURE_NAMES[:min(treasures, MAX_TREASURES)],
+                              rng.sample(shores, min(treasures, MAX_TREASURES, len(shores)))):
+        placed[name] = {'location': location, 'reward': rng.randint(1, 9)}
+
+    return {
+        'map': game_map,
+        'base': base,
+        'pirate_ships': pirate_ships,
+        'treasures': placed,
+        'marine_ships': marine_ships,
+        'turns to go': turns
+    }
+
+
+def _adjacent(x, y, rows, cols):
+    return [(a, b) for a, b in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)) if 0 <= a < rows and 0 <= b < cols]
+
+
+def _reachable(game_map, start):
+    rows, cols = len(game_map), len(game_map[0])
+    reached = {start}
+    queue = deque([start])
+    while queue:
+        for cell in _adjacent(*queue.popleft(), rows, cols):
+            if cell not in reached and game_map[cell[0]][cell[1]] != 'I':
+                reached.add(cell)
+                queue.append(cell)
+    return reached
+
+
+def _marine_path(game_map, start, length, base, rng):
+    """
+    A walk of up to length adjacent sea cells, preferring cells not visited yet
+    """
+    rows, cols = len(game_map), len(game_map[0])
+    path = [start]
+    while len(path) < length:
+        options = [cell for cell in _adjacent(*path[-1], rows, cols)
+                   if game_map[cell[0]][cell[1]] != 'I' and cell != base]
+        fresh = [cell for cell in options if cell not in path]
+        if not (fresh or options):
+            break
+        path.append(rng.choice(fresh or options))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes a generated game input as json.')
+    parser.add_argument('output')
+    parser.add_argument('--rows', type=int, default=7)
+    parser.add_argument('--cols', type=int, default=None)
+    parser.add_argument('--island-density', type=float, default=0.2)
+    parser.add_argument('--ships', type=int, default=2, help='ships per player')
+    parser.add_argument('--marines', type=int, default=2)
+    parser.add_argument('--treasures', type=int, default=1)
+    parser.add_argument('--turns', type=int, default=100)
+    parser.add_argument('--marine-path-length', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    an_input = generate(args.rows, args.cols, args.island_density, args.ships, args.marines, args.treasures,
+                        args.turns, args.marine_path_length, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(an_input, f)
+
+
+if __name__ == '__main__':
+    main()
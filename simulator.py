@@ -1,12 +1,46 @@
 from copy import deepcopy
+from hashlib import blake2b
+from itertools import product
 import logging
 import random
 
+from action_codec import ActionCodec
+
 
 TREASURE_ARRIVAL_PROBABILITY = 0.3
+ACTIONS_CACHE_SIZE = 100000
 TREASURE_NAMES = ["treasure_1", "treasure_2","treasure_3","treasure_4","treasure_5","treasure_6","treasure_7",
                   "treasure_8","treasure_9","treasure_10","treasure_11","treasure_12","treasure_13","treasure_14"]
 
+_zobrist_keys = {}
+
+
+def zobrist_key(feature):
+    """
+    The 64 bit random key of a feature of the state, e.g. ('ship', name, location).
+    Keys are derived from the feature itself, so they are the same in every process.
+    """
+    key = _zobrist_keys.get(feature)
+    if key is None:
+        key = _zobrist_keys[feature] = int.from_bytes(blake2b(repr(feature).encode(), digest_size=8).digest(), 'little')
+    return key
+
+
+def input_from_json(an_input):
+    """
+    Turns the locations json stores as lists back into tuples
+    """
+    an_input['base'] = tuple(an_input['base'])
+    for ship in an_input['pirate_ships'].values():
+        ship['location'] = tuple(ship['location'])
+    for treasure in an_input['treasures'].values():
+        if type(treasure['location']) != str:
+            treasure['location'] = tuple(treasure['location'])
+    for marine in an_input['marine_ships'].values():
+        marine['path'] = [tuple(cell) for cell in marine['path']]
+    return an_input
+
+
 class Simulator:
     """
     This the simulator class. You may use it for your agent.
@@ -18,152 +52,237 @@ class Simulator:
         self.score = {'player 1': 0, 'player 2': 0}
         self.dimensions = len(self.state['map']), len(self.state['map'][0])
         self.turns_to_go = self.state['turns to go']
+        self.rounds_to_go = self.state['turns to go']
         self.base_location = self.state['base']
         self.MARINE_COLLISION_PENALTY = 1
+        self._sea_neighbors, self._island_neighbors = self._build_neighbor_tables()
+        self._island_cells = [(x, y) for x in range(self.dimensions[0]) for y in range(self.dimensions[1])
+                              if self.state['map'][x][y] == 'I']
+        self._actions_cache = {}
+        self.codec = ActionCodec(self.state, TREASURE_NAMES)
+        self._index_state()
+
+    def _index_state(self):
+        """
+        recomputes everything derived from self.state, after it was replaced
+        """
+        self._undo_log = []
+        self._frames = []
+        self._board_hash = 0
+        for ship_name, ship in self.state['pirate_ships'].items():
+            self._board_hash ^= zobrist_key(('ship', ship_name, ship['location']))
+            self._board_hash ^= zobrist_key(('capacity', ship_name, ship['capacity']))
+        for treasure_name, treasure in self.state['treasures'].items():
+            self._board_hash ^= zobrist_key(('treasure', treasure_name, treasure['location'], treasure['reward']))
+        self._time_hash = zobrist_key(('turns', self.turns_to_go))
+        for marine_name, marine in self.state['marine_ships'].items():
+            self._time_hash ^= zobrist_key(('marine', marine_name, marine['index']))
+        # secondary indexes, dicts with None values are used as insertion ordered sets
+        self._player_ships = {}
+        for ship_name, ship in self.state['pirate_ships'].items():
+            self._player_ships.setdefault(ship['player'], {})[ship_name] = None
+        self._ships_at = {}
+        self._held = {ship_name: {} for ship_name in self.state['pirate_ships']}
+        self._treasures_at = {}
+        self._marine_cells = {}
+        for ship_name, ship in self.state['pirate_ships'].items():
+            self._ships_at.setdefault(ship['location'], {})[ship_name] = None
+        for treasure_name, treasure in self.state['treasures'].items():
+            self._index_treasure(treasure_name, treasure['location'])
+        for marine in self.state['marine_ships'].values():
+            self._add_marine_cell(marine['path'][marine['index']])
+
+    def _index_treasure(self, treasure_name, location):
+        if type(location) == str:
+            self._held[location][treasure_name] = None
+        else:
+            self._treasures_at.setdefault(location, {})[treasure_name] = None
+
+    def _unindex_treasure(self, treasure_name, location):
+        if type(location) == str:
+            del self._held[location][treasure_name]
+        else:
+            treasures = self._treasures_at[location]
+            del treasures[treasure_name]
+            if not treasures:
+                del self._treasures_at[location]
+
+    def _add_marine_cell(self, cell):
+        self._marine_cells[cell] = self._marine_cells.get(cell, 0) + 1
+
+    def _remove_marine_cell(self, cell):
+        if self._marine_cells[cell] == 1:
+            del self._marine_cells[cell]
+        else:
+            self._marine_cells[cell] -= 1
+
+    def _build_neighbor_tables(self):
+        """
+        builds, once per map, the sea neighbors and the island neighbors of every cell
+        """
+        game_map = self.state['map']
+        rows, cols = self.dimensions
+        sea_neighbors = {}
+        island_neighbors = {}
+        for x in range(rows):
+            for y in range(cols):
+                sea, island = [], []
+                for neighbor in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                    if 0 <= neighbor[0] < rows and 0 <= neighbor[1] < cols:
+                        if game_map[neighbor[0]][neighbor[1]] == 'I':
+                            island.append(neighbor)
+                        else:
+                            sea.append(neighbor)
+                sea_neighbors[(x, y)] = tuple(sea)
+                island_neighbors[(x, y)] = tuple(island)
+        return sea_neighbors, island_neighbors
 
     def neighbors(self, location):
         """
-        return the neighbors of a location
+        return the neighbors of a location (a tuple of the adjacent cells that are not islands)
         """
         if (type(location) == str):
-            return []
-        x, y = location[0], location[1]
-        neighbors = [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]
-        for neighbor in tuple(neighbors):
-            if neighbor[0] < 0 or neighbor[0] >= self.dimensions[1] or neighbor[1] < 0 or neighbor[1] >= \
-                    self.dimensions[0] or self.state['map'][neighbor[0]][neighbor[1]] == 'I':
-                neighbors.remove(neighbor)
-        return neighbors
+            return ()
+        return self._sea_neighbors.get(tuple(location), ())
 
-    def check_if_action_legal(self, action, player):
-        def _is_move_action_legal(move_action, player):
-            pirate_name = move_action[1]
-            if pirate_name not in self.state['pirate_ships'].keys():
-                logging.error(f"Pirate {pirate_name} does not exist!")
-                return False
-            if player != self.state['pirate_ships'][pirate_name]['player']:
-                logging.error(f"Pirate {pirate_name} does not belong to player {player}!")
-                return False
-            l1 = self.state['pirate_ships'][pirate_name]['location']
-            l2 = move_action[2]
-            if l2 not in self.neighbors(l1):
-                logging.error(f"Pirate {pirate_name} cannot move from {l1} to {l2}!")
-                return False
-            return True
+    def island_neighbors(self, location):
+        """
+        return the adjacent island cells of a location, where treasures can be collected from
+        """
+        if (type(location) == str):
+            return ()
+        return self._island_neighbors.get(tuple(location), ())
 
-        def _is_collect_action_legal(collect_action, player):
-            pirate_name = collect_action[1]
-            treasure_name = collect_action[2]
-            if player != self.state['pirate_ships'][pirate_name]['player']:
-                return False
-            # check adjacent position
-            l1 = self.state['treasures'][treasure_name]['location']
-            if self.state['pirate_ships'][pirate_name]['location'] not in self.neighbors(l1):
-                return False
-            # check ship capacity
-            if self.state['pirate_ships'][pirate_name]['capacity'] <= 0:
-                return False
-            return True
+    def _is_move_action_legal(self, move_action, player):
+        pirate_name = move_action[1]
+        if pirate_name not in self.state['pirate_ships']:
+            logging.error("Pirate %s does not exist!", pirate_name)
+            return False
+        if player != self.state['pirate_ships'][pirate_name]['player']:
+            logging.error("Pirate %s does not belong to player %s!", pirate_name, player)
+            return False
+        l1 = self.state['pirate_ships'][pirate_name]['location']
+        l2 = move_action[2]
+        if l2 not in self.neighbors(l1):
+            logging.error("Pirate %s cannot move from %s to %s!", pirate_name, l1, l2)
+            return False
+        return True
 
-        def _is_deposit_action_legal(deposit_action, player):
-            pirate_name = deposit_action[1]
-            treasure_name = deposit_action[2]
-            # check same position
-            if player != self.state['pirate_ships'][pirate_name]['player']:
-                return False
-            if self.state["pirate_ships"][pirate_name]["location"] != self.base_location:
-                return False
-            if self.state['treasures'][treasure_name]['location'] != pirate_name:
-                return False
-            return True
+    def _is_collect_action_legal(self, collect_action, player):
+        pirate_name = collect_action[1]
+        treasure_name = collect_action[2]
+        if player != self.state['pirate_ships'][pirate_name]['player']:
+            return False
+        # check adjacent position
+        l1 = self.state['treasures'][treasure_name]['location']
+        if self.state['pirate_ships'][pirate_name]['location'] not in self.neighbors(l1):
+            return False
+        # check ship capacity
+        if self.state['pirate_ships'][pirate_name]['capacity'] <= 0:
+            return False
+        return True
 
-        def _is_plunder_action_legal(plunder_action, player):
-            pirate_1_name = plunder_action[1]
-            pirate_2_name = plunder_action[2]
-            if player != self.state["pirate_ships"][pirate_1_name]["player"]:
-                return False
-            if self.state["pirate_ships"][pirate_1_name]["location"] != self.state["pirate_ships"][pirate_2_name]["location"]:
-                return False
-            return True
+    def _is_deposit_action_legal(self, deposit_action, player):
+        pirate_name = deposit_action[1]
+        treasure_name = deposit_action[2]
+        # check same position
+        if player != self.state['pirate_ships'][pirate_name]['player']:
+            return False
+        if self.state["pirate_ships"][pirate_name]["location"] != self.base_location:
+            return False
+        if self.state['treasures'][treasure_name]['location'] != pirate_name:
+            return False
+        return True
+
+    def _is_plunder_action_legal(self, plunder_action, player):
+        pirate_1_name = plunder_action[1]
+        pirate_2_name = plunder_action[2]
+        if player != self.state["pirate_ships"][pirate_1_name]["player"]:
+            return False
+        if self.state["pirate_ships"][pirate_1_name]["location"] != self.state["pirate_ships"][pirate_2_name]["location"]:
+            return False
+        return True
 
-        def _is_action_mutex(global_action):
-            assert type(
-                global_action) == tuple, "global action must be a tuple"
-            # one action per ship
-            if len(set([a[1] for a in global_action])) != len(global_action):
+    @staticmethod
+    def _is_action_mutex(global_action):
+        assert type(
+            global_action) == tuple, "global action must be a tuple"
+        # one action per ship
+        if len(set([a[1] for a in global_action])) != len(global_action):
+            return True
+        # collect the same treasure
+        collect_actions = [a for a in global_action if a[0] == 'collect']
+        if len(collect_actions) > 1:
+            treasures_to_collect = set([a[2] for a in collect_actions])
+            if len(treasures_to_collect) != len(collect_actions):
                 return True
-            # collect the same treasure
-            collect_actions = [a for a in global_action if a[0] == 'collect']
-            if len(collect_actions) > 1:
-                treasures_to_collect = set([a[2] for a in collect_actions])
-                if len(treasures_to_collect) != len(collect_actions):
-                    return True
 
-            return False
+        return False
 
-        players_pirates = [pirate for pirate in self.state['pirate_ships'].keys() if self.state['pirate_ships'][pirate]['player'] == player]
+    def check_if_action_legal(self, action, player):
+        """
+        returns whether action is a legal joint action of player: one legal atomic action per ship and no mutex
+        """
+        players_pirates = self._player_ships.get(player, ())
 
         if len(action) != len(players_pirates):
-            logging.error(f"You had given {len(action)} atomic commands, while you control {len(players_pirates)}!")
+            logging.error("You had given %s atomic commands, while you control %s!", len(action), len(players_pirates))
             return False
         for atomic_action in action:
             # trying to act with a pirate that is not yours
             if atomic_action[1] not in players_pirates:
-                logging.error(f"Pirate ship {atomic_action[1]} is not yours!")
+                logging.error("Pirate ship %s is not yours!", atomic_action[1])
                 return False
             # illegal sail action
             if atomic_action[0] == 'sail':
-                if not _is_move_action_legal(atomic_action, player):
-                    logging.error(f"Sail action {atomic_action} is illegal!")
+                if not self._is_move_action_legal(atomic_action, player):
+                    logging.error("Sail action %s is illegal!", atomic_action)
                     return False
             # illegal collect action
             elif atomic_action[0] == 'collect':
-                if not _is_collect_action_legal(atomic_action, player):
-                    logging.error(f"Collect action {atomic_action} is illegal!")
+                if not self._is_collect_action_legal(atomic_action, player):
+                    logging.error("Collect action %s is illegal!", atomic_action)
                     return False
             # illegal deposit action
             elif atomic_action[0] == 'deposit':
-                if not _is_deposit_action_legal(atomic_action, player):
-                    logging.error(f"Deposit action {atomic_action} is illegal!")
+                if not self._is_deposit_action_legal(atomic_action, player):
+                    logging.error("Deposit action %s is illegal!", atomic_action)
                     return False
             # illegal plunder action
             elif atomic_action[0] == "plunder":
-                if not _is_plunder_action_legal(atomic_action, player):
-                    logging.error(f"Plunder action {atomic_action} is illegal!")
+                if not self._is_plunder_action_legal(atomic_action, player):
+                    logging.error("Plunder action %s is illegal!", atomic_action)
                     return False
             elif atomic_action[0] != 'wait':
                 return False
         # check mutex action
-        if _is_action_mutex(action):
-            logging.error(f"Actions {action} are mutex!")
+        if self._is_action_mutex(action):
+            logging.error("Actions %s are mutex!", action)
             return False
         return True
 
     def apply_action(self, action, player):
         for atomic_action in action:
             self._apply_atomic_action(atomic_action, player)
-        self.turns_to_go -= 1
+        self._set_turns_to_go(self.turns_to_go - 1)
 
     def check_collision_with_marines(self):
         """
         Checks collisions with marines, applies penalties. Does not move them
+        Returns the names of the ships that collided.
         """
-        marine_locations = []
         treasures_to_remove = []
-        for marine_stats in self.state["marine_ships"].values():
-            index = marine_stats["index"]
-            marine_locations.append(marine_stats["path"][index])
-
-        for ship_name in self.state["pirate_ships"].keys():
-            if self.state["pirate_ships"][ship_name]["location"] in marine_locations:
-                self.state["pirate_ships"][ship_name]["capacity"] = 2
+        collided = []
+        for marine_location in self._marine_cells:
+            for ship_name in self._ships_at.get(marine_location, ()):
+                collided.append(ship_name)
+                self._set_ship_capacity(ship_name, 2)
                 player = self.state["pirate_ships"][ship_name]["player"]
-                self.score[f"player {player}"] -= self.MARINE_COLLISION_PENALTY
-                for treasure_name in self.state["treasures"].keys():
-                    if self.state["treasures"][treasure_name]["location"] == ship_name:
-                        treasures_to_remove.append(treasure_name)
+                self._add_score(f"player {player}", -self.MARINE_COLLISION_PENALTY)
+                treasures_to_remove.extend(self._held[ship_name])
         for treasures_r in treasures_to_remove:
-            del self.state["treasures"][treasures_r]
+            self._remove_treasure(treasures_r)
+        return collided
 
     def move_marines(self):
         """
@@ -175,12 +294,12 @@ class Simulator:
             if len(marine_stats["path"]) == 1:
                 continue
             if index == 0:
-                marine_stats["index"] = random.choice([0, 1])
+                self._set_marine_index(marine, random.choice([0, 1]))
             elif index == len(marine_stats["path"])-1:
-                marine_stats["index"] = random.choice([index, index-1])
+                self._set_marine_index(marine, random.choice([index, index-1]))
             else:
-                marine_stats["index"] = random.choice(
-                    [index-1, index, index+1])
+                self._set_marine_index(marine, random.choice(
+                    [index-1, index, index+1]))
 
     def _apply_atomic_action(self, atomic_action, player):
         """
@@ -188,28 +307,25 @@ class Simulator:
         """
         pirate_name = atomic_action[1]
         if atomic_action[0] == 'sail':
-            self.state['pirate_ships'][pirate_name]['location'] = atomic_action[2]
+            self._set_ship_location(pirate_name, atomic_action[2])
             return
         elif atomic_action[0] == 'collect':
             treasure_name = atomic_action[2]
-            self.state["pirate_ships"][pirate_name]["capacity"] -=1
-            self.state["treasures"][treasure_name]["location"] = pirate_name
+            self._set_ship_capacity(pirate_name, self.state["pirate_ships"][pirate_name]["capacity"] - 1)
+            self._set_treasure_location(treasure_name, pirate_name)
             return
         elif atomic_action[0] == 'deposit':
             treasure_name = atomic_action[2]
-            self.state['pirate_ships'][pirate_name]['capacity'] += 1
-            self.score[f"player {player}"] += self.state['treasures'][treasure_name]['reward']
-            del self.state['treasures'][treasure_name]
+            self._set_ship_capacity(pirate_name, self.state['pirate_ships'][pirate_name]['capacity'] + 1)
+            self._add_score(f"player {player}", self.state['treasures'][treasure_name]['reward'])
+            self._remove_treasure(treasure_name)
             return
         elif atomic_action[0] == 'plunder':
             advers_pirate_name = atomic_action[2]
-            plundered_treasures = []
-            self.state["pirate_ships"][advers_pirate_name]["capacity"] = 2
-            for treasure_adv in self.state["treasures"].keys():
-                if self.state["treasures"][treasure_adv]["location"] == advers_pirate_name:
-                    plundered_treasures.append(treasure_adv)
+            plundered_treasures = list(self._held[advers_pirate_name])
+            self._set_ship_capacity(advers_pirate_name, 2)
             for p_treas in plundered_treasures:
-                del self.state["treasures"][p_treas]
+                self._remove_treasure(p_treas)
             return
         elif atomic_action[0] == 'wait':
             return
@@ -217,30 +333,305 @@ class Simulator:
             raise NotImplemented
 
     def add_treasure(self):
+        """
+        Returns the name of the treasure that arrived, or None
+        """
         if len(self.state['treasures']) > 9:
             return
         if random.random() < TREASURE_ARRIVAL_PROBABILITY:
-            while True:
-                treasure_name = random.choice(TREASURE_NAMES)
-                if treasure_name not in self.state['treasures'].keys():
-                    break
-            while True:
-                treasure_location = (
-                random.randint(0, self.dimensions[0] - 1), random.randint(0, self.dimensions[1] - 1))
-                if self.state['map'][treasure_location[0]][treasure_location[1]] == 'I':
-                    break
-
+            free_names = [name for name in TREASURE_NAMES if name not in self.state['treasures']]
+            if not free_names or not self._island_cells:
+                return
+            treasure_name = random.choice(free_names)
+            treasure_location = random.choice(self._island_cells)
             reward = random.randint(1, 9)
-            self.state['treasures'][treasure_name] = {'location': treasure_location,
-                                                        'reward': reward}
+            self._place_treasure(treasure_name, treasure_location, reward)
+            return treasure_name
+
+    def place_treasure(self, treasure_name, location, reward):
+        """
+        Puts a treasure on the map, e.g. to replay a recorded arrival
+        """
+        self._place_treasure(treasure_name, location, reward)
+
+    def set_marine_index(self, marine_name, index):
+        """
+        Moves a marine to an index of its path, e.g. to replay a recorded move
+        """
+        self._set_marine_index(marine_name, index)
+
+    # All changes to the state go through the setters below, so that push()/pop() can undo them
+    # and the zobrist hash stays up to date.
+
+    def _set_ship_location(self, ship_name, location):
+        ship = self.state['pirate_ships'][ship_name]
+        if self._frames:
+            self._undo_log.append(('location', ship_name, ship['location']))
+        self._board_hash ^= zobrist_key(('ship', ship_name, ship['location'])) ^ zobrist_key(
+            ('ship', ship_name, location))
+        ships = self._ships_at[ship['location']]
+        del ships[ship_name]
+        if not ships:
+            del self._ships_at[ship['location']]
+        self._ships_at.setdefault(location, {})[ship_name] = None
+        ship['location'] = location
+
+    def _set_ship_capacity(self, ship_name, capacity):
+        ship = self.state['pirate_ships'][ship_name]
+        if self._frames:
+            self._undo_log.append(('capacity', ship_name, ship['capacity']))
+        self._board_hash ^= zobrist_key(('capacity', ship_name, ship['capacity'])) ^ zobrist_key(
+            ('capacity', ship_name, capacity))
+        ship['capacity'] = capacity
+
+    def _set_treasure_location(self, treasure_name, location):
+        treasure = self.state['treasures'][treasure_name]
+        if self._frames:
+            self._undo_log.append(('treasure', treasure_name, treasure['location']))
+        self._board_hash ^= zobrist_key(('treasure', treasure_name, treasure['location'], treasure['reward'])) ^ \
+            zobrist_key(('treasure', treasure_name, location, treasure['reward']))
+        self._unindex_treasure(treasure_name, treasure['location'])
+        self._index_treasure(treasure_name, location)
+        treasure['location'] = location
+
+    def _place_treasure(self, treasure_name, location, reward):
+        if self._frames:
+            self._undo_log.append(('placed', treasure_name, None))
+        self._board_hash ^= zobrist_key(('treasure', treasure_name, location, reward))
+        self._index_treasure(treasure_name, location)
+        self.state['treasures'][treasure_name] = {'location': location, 'reward': reward}
+
+    def _remove_treasure(self, treasure_name):
+        treasure = self.state['treasures'][treasure_name]
+        if self._frames:
+            self._undo_log.append(('removed', treasure_name, treasure))
+        self._board_hash ^= zobrist_key(('treasure', treasure_name, treasure['location'], treasure['reward']))
+        self._unindex_treasure(treasure_name, treasure['location'])
+        del self.state['treasures'][treasure_name]
+
+    def _add_score(self, player_key, delta):
+        if self._frames:
+            self._undo_log.append(('score', player_key, self.score[player_key]))
+        self.score[player_key] += delta
+
+    def _set_marine_index(self, marine_name, index):
+        marine = self.state['marine_ships'][marine_name]
+        if self._frames:
+            self._undo_log.append(('marine', marine_name, marine['index']))
+        self._time_hash ^= zobrist_key(('marine', marine_name, marine['index'])) ^ zobrist_key(
+            ('marine', marine_name, index))
+        self._remove_marine_cell(marine['path'][marine['index']])
+        self._add_marine_cell(marine['path'][index])
+        marine['index'] = index
+
+    def _set_turns_to_go(self, turns_to_go):
+        if self._frames:
+            self._undo_log.append(('turns', None, self.turns_to_go))
+        self._time_hash ^= zobrist_key(('turns', self.turns_to_go)) ^ zobrist_key(('turns', turns_to_go))
+        self.turns_to_go = turns_to_go
+
+    def _set_rounds_to_go(self, rounds_to_go):
+        if self._frames:
+            self._undo_log.append(('rounds', None, self.rounds_to_go))
+        self.rounds_to_go = rounds_to_go
+
+    def push(self, action, player):
+        """
+        Applies action (without checking it) and opens an undo frame.
+        Every change made until the matching pop(), including act(), add_treasure(), move_marines() and
+        check_collision_with_marines(), is undone by that pop().
+        """
+        self._frames.append(len(self._undo_log))
+        self.apply_action(action, player)
+
+    def pop(self):
+        """
+        Undoes every change made since the last push()
+        """
+        start = self._frames.pop()
+        entries = self._undo_log[start:]
+        del self._undo_log[start:]
+        frames, self._frames = self._frames, []
+        for kind, name, old in reversed(entries):
+            if kind == 'location':
+                self._set_ship_location(name, old)
+            elif kind == 'capacity':
+                self._set_ship_capacity(name, old)
+            elif kind == 'treasure':
+                self._set_treasure_location(name, old)
+            elif kind == 'placed':
+                self._remove_treasure(name)
+            elif kind == 'removed':
+                self._place_treasure(name, old['location'], old['reward'])
+            elif kind == 'score':
+                self._add_score(name, old - self.score[name])
+            elif kind == 'marine':
+                self._set_marine_index(name, old)
+            elif kind == 'turns':
+                self._set_turns_to_go(old)
+            elif kind == 'rounds':
+                self._set_rounds_to_go(old)
+        self._frames = frames
+
+    def snapshot(self):
+        """
+        Returns a copy of the game that restore() can return to.
+        Only the ships, treasures and marines are copied, the map and the marine paths are shared.
+        """
+        return self._copy_state(self.state), dict(self.score), self.turns_to_go, self.rounds_to_go
+
+    def restore(self, snapshot):
+        """
+        Returns the game to a snapshot() taken earlier. The snapshot may be restored again later.
+        Pending push() frames are discarded.
+        """
+        state, score, turns_to_go, rounds_to_go = snapshot
+        self.state = self._copy_state(state)
+        self.score = dict(score)
+        self.turns_to_go = turns_to_go
+        self.rounds_to_go = rounds_to_go
+        self._index_state()
+
+    @staticmethod
+    def _copy_state(state):
+        copied = dict(state)
+        copied['pirate_ships'] = {name: dict(ship) for name, ship in state['pirate_ships'].items()}
+        copied['treasures'] = {name: dict(treasure) for name, treasure in state['treasures'].items()}
+        copied['marine_ships'] = {name: dict(marine) for name, marine in state['marine_ships'].items()}
+        return copied
 
     def act(self, action, player):
+        """
+        Returns the name of the treasure that arrived after the action, or None
+        """
         if self.check_if_action_legal(action, player):
             self.apply_action(action, player)
-            self.add_treasure()
+            return self.add_treasure()
         else:
             raise ValueError(f"Illegal action!")
 
+    def act_unchecked(self, action, player):
+        """
+        act() without the legality check, for actions that are known to be legal,
+        e.g. the ones yielded by legal_joint_actions()
+        """
+        self.apply_action(action, player)
+        return self.add_treasure()
+
+    def act_encoded(self, code, player, check=True):
+        """
+        act() with a joint action packed by self.codec
+        """
+        action = self.codec.decode(code, player, self.state)
+        if check:
+            return self.act(action, player)
+        return self.act_unchecked(action, player)
+
+    def step_encoded(self, code_p1, code_p2, check=True):
+        """
+        step() with joint actions packed by self.codec, the action of player 2 is decoded after player 1 moved
+        """
+        score_1, score_2 = self.score['player 1'], self.score['player 2']
+        self.act_encoded(code_p1, 1, check)
+        self.act_encoded(code_p2, 2, check)
+        self.end_round()
+        return (self.score['player 1'] - score_1, self.score['player 2'] - score_2), self.rounds_to_go <= 0
+
+    def end_round(self):
+        """
+        The end of a round in Game.play_episode, after both players acted: collisions with marines are checked,
+        the marines move and the round is counted. Returns the names of the ships that collided.
+        """
+        collided = self.check_collision_with_marines()
+        self.move_marines()
+        self._set_rounds_to_go(self.rounds_to_go - 1)
+        return collided
+
+    def step(self, action_p1, action_p2, check=True):
+        """
+        Plays a full round in the order of Game.play_episode: player 1 acts, player 2 acts (each followed by a
+        treasure spawn), collisions with marines are checked and the marines move.
+        Set check to False for actions that are known to be legal.
+        Returns the score change of both players in the round and whether the game is over.
+        """
+        score_1, score_2 = self.score['player 1'], self.score['player 2']
+        for player, action in ((1, action_p1), (2, action_p2)):
+            if check and not self.check_if_action_legal(action, player):
+                raise ValueError(f"Illegal action!")
+            self.apply_action(action, player)
+            self.add_treasure()
+        self.end_round()
+        return (self.score['player 1'] - score_1, self.score['player 2'] - score_2), self.rounds_to_go <= 0
+
+    def state_key(self):
+        """
+        A 64 bit zobrist hash of the ship locations and capacities, the treasures, the marine indices and the turns
+        to go. It is updated incrementally, so the state must only be changed through the simulator
+        (or set_state()).
+        """
+        return self._board_hash ^ self._time_hash
+
+    def legal_atomic_actions(self, ship_name):
+        """
+        return the legal atomic actions of a ship: sail to a neighbor, collect an adjacent treasure, deposit a held
+        treasure at the base, plunder an enemy ship on the same cell and wait
+        """
+        key = (self._board_hash, ship_name)
+        actions = self._actions_cache.get(key)
+        if actions is None:
+            if len(self._actions_cache) >= ACTIONS_CACHE_SIZE:
+                self._actions_cache.clear()
+            actions = self._actions_cache[key] = self._compute_atomic_actions(ship_name)
+        return actions
+
+    def _compute_atomic_actions(self, ship_name):
+        ship = self.state['pirate_ships'][ship_name]
+        location = ship['location']
+        actions = [('sail', ship_name, neighbor) for neighbor in self.neighbors(location)]
+        if ship['capacity'] > 0:
+            for cell in self._sea_neighbors[location] + self._island_neighbors[location]:
+                for treasure_name in self._treasures_at.get(cell, ()):
+                    actions.append(('collect', ship_name, treasure_name))
+        if location == self.base_location:
+            for treasure_name in self._held[ship_name]:
+                actions.append(('deposit', ship_name, treasure_name))
+        for other_name in self._ships_at[location]:
+            if self.state['pirate_ships'][other_name]['player'] != ship['player']:
+                actions.append(('plunder', ship_name, other_name))
+        actions.append(('wait', ship_name))
+        return tuple(actions)
+
+    def legal_joint_actions(self, player):
+        """
+        lazily yields the legal actions of a player, one atomic action per ship without collecting a treasure twice
+        """
+        ships_actions = [self.legal_atomic_actions(ship_name) for ship_name, ship in self.state['pirate_ships'].items()
+                         if ship['player'] == player]
+        for action in product(*ships_actions):
+            collected = [atomic_action[2] for atomic_action in action if atomic_action[0] == 'collect']
+            if len(collected) > 1 and len(set(collected)) != len(collected):
+                continue
+            yield action
+
+    def legal_joint_action_codes(self, player):
+        """
+        legal_joint_actions() packed by self.codec
+        """
+        num_actions = self.codec.num_actions
+        ships_codes = []
+        for ship_name in reversed(self.codec.player_ships.get(player, ())):
+            location = self.state['pirate_ships'][ship_name]['location']
+            ships_codes.append([(self.codec.encode_atomic(atomic_action, location), atomic_action)
+                                for atomic_action in self.legal_atomic_actions(ship_name)])
+        for combination in product(*ships_codes):
+            collected = [atomic_action[2] for _, atomic_action in combination if atomic_action[0] == 'collect']
+            if len(collected) > 1 and len(set(collected)) != len(collected):
+                continue
+            code = 0
+            for atomic_code, _ in combination:
+                code = code * num_actions + atomic_code
+            yield code
+
     def print_scores(self):
         print(f"Scores: player 1: {self.score[0]}, player 2: {self.score[1]}")
 
@@ -260,6 +651,7 @@ class Simulator:
 
     def set_state(self, state):
         self.state = state
+        self._index_state()
 
     def get_state(self):
         return self.state
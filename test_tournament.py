@@ -0,0 +1,24 @@
+import sys
+import types
+
+import tournament
+from main import PENALTY, default_input
+
+
+class IllegalAgent:
+    def __init__(self, initial_state, player_number):
+        self.ids = ['illegal']
+
+    def act(self, state):
+        return (('sail', 'no_such_ship', (0, 0)),)
+
+
+def test_penalty_is_reported_under_the_failing_agent(monkeypatch):
+    module = types.ModuleType('illegal_agent')
+    module.Agent = IllegalAgent
+    monkeypatch.setitem(sys.modules, 'illegal_agent', module)
+    for swapped in (False, True):
+        score_a, score_b = tournament.play_episode((default_input(), 'illegal_agent', 'sample_agent', swapped, 0,
+                                                    False))
+        assert score_a <= -PENALTY
+        assert score_b > -PENALTY
@@ -0,0 +1,41 @@
+PHASES = ('act', 'legality', 'apply', 'spawn', 'collision', 'marines')
+ROUND = '-'
+
+
+class PhaseTimer:
+    """
+    Records how many nanoseconds each phase of each turn took, per episode and agent.
+    The collision and marines phases belong to the round, they are recorded with the agent ROUND.
+    """
+    def __init__(self):
+        self.records = []
+
+    def add(self, episode, turn, agent, phase, nanoseconds):
+        self.records.append((episode, turn, agent, phase, nanoseconds))
+
+    def summary(self, by_episode=False):
+        """
+        phase -> agent -> count, total, mean and max milliseconds.
+        With by_episode the agents are split per episode, as 'agent #episode'.
+        """
+        grouped = {}
+        for episode, _, agent, phase, nanoseconds in self.records:
+            key = f'{agent} #{episode}' if by_episode else agent
+            grouped.setdefault(phase, {}).setdefault(key, []).append(nanoseconds)
+        summary = {}
+        for phase in PHASES:
+            for agent, times in grouped.get(phase, {}).items():
+                summary.setdefault(phase, {})[agent] = {'count': len(times), 'total_ms': sum(times) / 1e6,
+                                                        'mean_ms': sum(times) / len(times) / 1e6,
+                                                        'max_ms': max(times) / 1e6}
+        return summary
+
+
+def format_summary(summary):
+    width = max([len(agent) for agents in summary.values() for agent in agents] + [5])
+    lines = [f"{'phase':<10} {'agent':<{width}} {'count':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}"]
+    for phase, agents in summary.items():
+        for agent, stats in agents.items():
+            lines.append(f"{phase:<10} {agent:<{width}} {stats['count']:>7} {stats['total_ms']:>10.2f} "
+                         f"{stats['mean_ms']:>9.4f} {stats['max_ms']:>9.4f}")
+    return '\n'.join(lines)
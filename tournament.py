@@ -0,0 +1,105 @@
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+
+from main import Game, default_input
+from simulator import input_from_json
+
+
+def load_agent(spec):
+    """
+    spec is a module name, optionally followed by ':UCTAgent' to play the module's UCT agent
+    """
+    module_name, _, class_name = spec.partition(':')
+    return importlib.import_module(module_name), class_name == 'UCTAgent'
+
+
+def load_input(path):
+    """
+    Reads a game input from a json file
+    """
+    with open(path) as f:
+        return input_from_json(json.load(f))
+
+
+def play_episode(job):
+    """
+    Plays one episode of agent_a against agent_b. Runs in a worker process.
+    When swapped, agent_b plays as player 1. Returns (agent_a score, agent_b score) as counted by Game.
+    """
+    an_input, agent_a, agent_b, swapped, seed, isolated = job
+    random.seed(seed)
+    game = Game(an_input, quiet=True)
+    (module_a, uct_a), (module_b, uct_b) = load_agent(agent_a), load_agent(agent_b)
+    if not swapped:
+        game.agents = [game.initiate_agent(module_a, 1, uct_a, isolated),
+                       game.initiate_agent(module_b, 2, uct_b, isolated)]
+        game.ids = [agent_a, agent_b]
+    else:
+        game.agents = [game.initiate_agent(module_b, 1, uct_b, isolated),
+                       game.initiate_agent(module_a, 2, uct_a, isolated)]
+        game.ids = [agent_b, agent_a]
+    game.play_episode(swapped)
+    return tuple(game.score)
+
+
+def confidence_interval(scores, z=1.96):
+    """
+    mean and half width of the normal approximation confidence interval of the mean
+    """
+    mean = sum(scores) / len(scores)
+    if len(scores) < 2:
+        return mean, float('inf')
+    variance = sum((score - mean) ** 2 for score in scores) / (len(scores) - 1)
+    return mean, z * math.sqrt(variance / len(scores))
+
+
+def run_tournament(agent_a, agent_b, inputs, episodes, workers=None, seed=0, isolated=False):
+    """
+    Plays episodes episodes per input and seat order over a process pool of workers processes
+    (all cores by default). Returns per agent statistics of the episode scores.
+    With isolated, every agent runs in its own process and is killed when it exceeds the action timeout.
+    """
+    jobs = []
+    rng = random.Random(seed)
+    for an_input in inputs:
+        for swapped in (False, True):
+            for _ in range(episodes):
+                jobs.append((an_input, agent_a, agent_b, swapped, rng.getrandbits(32), isolated))
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(play_episode, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+    report = {}
+    names = (agent_a, agent_b) if agent_a != agent_b else (f'{agent_a} (a)', f'{agent_b} (b)')
+    for i, name in enumerate(names):
+        scores = [result[i] for result in results]
+        mean, half_width = confidence_interval(scores)
+        report[name] = {'episodes': len(scores), 'mean': mean, 'ci95': half_width,
+                        'min': min(scores), 'max': max(scores)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays many episodes between two agents in parallel.')
+    parser.add_argument('agent_a', help="module name, add ':UCTAgent' for its UCT agent")
+    parser.add_argument('agent_b', nargs='?', default='sample_agent')
+    parser.add_argument('--inputs', nargs='*', default=[], help='json files with game inputs, main.py input if empty')
+    parser.add_argument('--episodes', type=int, default=10, help='episodes per input and seat order')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--isolated', action='store_true', help='run every agent in its own process')
+    args = parser.parse_args()
+    inputs = [load_input(path) for path in args.inputs] or [default_input()]
+    report = run_tournament(args.agent_a, args.agent_b, inputs, args.episodes, args.workers, args.seed,
+                            args.isolated)
+    for name, stats in report.items():
+        print(f"{name}: {stats['mean']:.2f} +- {stats['ci95']:.2f} over {stats['episodes']} episodes "
+              f"(min {stats['min']}, max {stats['max']})")
+
+
+if __name__ == '__main__':
+    main()